@@ -0,0 +1,297 @@
+"""
+Benchmark suite over the variable / value heuristic matrix
+
+Every combination of heuristics is run over the same puzzles several times with fixed random seeds, after a few
+untimed warmup solves. A puzzle's time is the median of its repetitions, and each combination is summarized by the
+distribution of those times over the puzzles (median, 95th percentile, max), so one slow outlier or one noisy run
+does not decide a comparison. Every solve has a node budget, so a hopeless combination (e.g. no variable
+heuristic) can't stall the sweep: a puzzle cut off in some repetition counts as failed and as capped, and its times
+are those of the cut off searches. Results can be saved as JSON (also usable as a baseline) or CSV, and a run can be
+compared against a saved baseline to flag regressions.
+
+"""
+import csv
+import json
+import os
+import random
+import sys
+
+from itertools import islice
+from statistics import median
+
+from helper_functions import read_puzzles, solve_chunk
+from heuristics import VALUE_HEURISTICS, VARIABLE_HEURISTICS
+from inference import PROPAGATION_LEVELS
+from solvers import ENGINES, make_solver
+
+NODE_LIMIT = 10000      # default node budget of a benchmarked solve (about a second for the csp engine)
+
+# columns of a result row, in the order they are written to CSV
+FIELDS = ('corpus', 'engine', 'propagate', 'variable', 'value', 'puzzles', 'failed', 'capped', 'repetitions', 'mean',
+          'median', 'p95', 'max', 'total')
+
+# statistics compared against a baseline
+COMPARED = ('median', 'p95')
+
+
+def percentile(values, fraction):
+    """
+    Percentile of some values, interpolating linearly between the closest ranks.
+
+    :param values: a non-empty list of numbers
+    :param fraction: the percentile as a fraction, e.g. 0.95
+    :return: the percentile
+    """
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def time_puzzles(puzzles, solver, repetitions=3, warmup=1, seed=0):
+    """
+    Times every puzzle of a set several times.
+
+    Before each repetition the global random state is seeded with seed + repetition, so randomized heuristics make
+    the same choices in every run of the benchmark.
+
+    :param puzzles: a list of 2D array boards
+    :param solver: the solver to be timed
+    :param repetitions: number of timed solves of every puzzle
+    :param warmup: number of puzzles solved once, untimed, before the repetitions
+    :param seed: base random seed
+    :return: a tuple (list of the median time per puzzle, number of puzzles not solved in some repetition, number
+             of puzzles the solver gave up on after its node limit in some repetition)
+    """
+    random.seed(seed)
+    solve_chunk(enumerate(puzzles[:warmup]), solver)
+
+    times = [[] for _ in puzzles]
+    failed = set()
+    capped = set()
+
+    for repetition in range(repetitions):
+        random.seed(seed + repetition)
+        for index, puzzle in enumerate(puzzles):
+            result, = solve_chunk([(index, puzzle)], solver)
+            times[index].append(result.seconds)
+            if result.board is None:
+                failed.add(index)
+                if getattr(solver, 'cutoff', False):
+                    capped.add(index)
+
+    return [median(puzzle_times) for puzzle_times in times], len(failed), len(capped)
+
+
+def summarize(times):
+    """
+    Summarizes the per-puzzle times of a combination.
+
+    :param times: a non-empty list of seconds per puzzle
+    :return: a dict with the mean, median, p95, max and total of the times
+    """
+    return {
+        'mean': sum(times) / len(times),
+        'median': median(times),
+        'p95': percentile(times, 0.95),
+        'max': max(times),
+        'total': sum(times),
+    }
+
+
+def run_benchmark(corpora, variable_ids=VARIABLE_HEURISTICS, value_ids=VALUE_HEURISTICS, engine='csp',
+                  propagate='fc', repetitions=3, warmup=1, seed=0, limit=None, node_limit=NODE_LIMIT, verbose=True):
+    """
+    Benchmarks every combination of heuristics over some puzzle files.
+
+    :param corpora: a list of puzzle file names (any format read_puzzles detects)
+    :param variable_ids: the variable heuristic identifiers to sweep
+    :param value_ids: the value heuristic identifiers to sweep
+    :param engine: one of ENGINES (dlx ignores the heuristics and is run once per corpus)
+    :param propagate: propagation level of the csp engine
+    :param repetitions: number of timed solves of every puzzle
+    :param warmup: number of untimed warmup solves per combination
+    :param seed: base random seed
+    :param limit: only use the first limit puzzles of every file
+    :param node_limit: node budget of every solve (None for no limit), puzzles cut off are reported as capped
+    :param verbose: whether to print a line per combination as it finishes
+    :return: a list of result rows, dicts with the keys of FIELDS
+    """
+    if engine == 'dlx':
+        variable_ids, value_ids = ('none',), ('none',)
+
+    rows = []
+    for corpus in corpora:
+        puzzles = list(islice(read_puzzles(corpus), limit))
+        if not puzzles:
+            raise ValueError('No puzzles in {}'.format(corpus))
+
+        for variable_id in variable_ids:
+            for value_id in value_ids:
+                solver = make_solver(engine, variable_id, value_id, propagate, node_limit)
+                times, failed, capped = time_puzzles(puzzles, solver, repetitions, warmup, seed)
+
+                row = {'corpus': os.path.basename(corpus), 'engine': engine, 'propagate': propagate,
+                       'variable': variable_id, 'value': value_id, 'puzzles': len(puzzles), 'failed': failed,
+                       'capped': capped, 'repetitions': repetitions}
+                row.update(summarize(times))
+                rows.append(row)
+
+                if verbose:
+                    print('{corpus} {variable}/{value}: median {median:.6f} p95 {p95:.6f} max {max:.6f} seconds '
+                          '({failed} failed, {capped} capped)'.format(**row))
+
+    return rows
+
+
+def _key(row):
+    return row['corpus'], row['engine'], row['propagate'], row['variable'], row['value']
+
+
+def compare(rows, baseline, threshold=0.1):
+    """
+    Compares results against a baseline.
+
+    :param rows: result rows of run_benchmark
+    :param baseline: result rows of an earlier run
+    :param threshold: relative slowdown of a compared statistic (see COMPARED) that counts as a regression
+    :return: a list of (row, statistic, baseline value, new value) tuples, one per regression; more failed puzzles
+             than in the baseline are reported with the statistic 'failed'
+    """
+    baseline = {_key(row): row for row in baseline}
+    regressions = []
+
+    for row in rows:
+        old = baseline.get(_key(row))
+        if old is None:
+            continue
+
+        if row['failed'] > old['failed']:
+            regressions.append((row, 'failed', old['failed'], row['failed']))
+        for statistic in COMPARED:
+            if row[statistic] > old[statistic] * (1 + threshold):
+                regressions.append((row, statistic, old[statistic], row[statistic]))
+
+    return regressions
+
+
+def write_json(rows, output_file):
+    """
+    Writes result rows to a JSON file (readable by load_results as a baseline).
+
+    :param rows: result rows of run_benchmark
+    :param output_file: name of the file to be written
+    """
+    with open(output_file, 'w') as f:
+        json.dump({'results': rows}, f, indent=2)
+
+
+def write_csv(rows, output_file):
+    """
+    Writes result rows to a CSV file with a header line.
+
+    :param rows: result rows of run_benchmark
+    :param output_file: name of the file to be written
+    """
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def load_results(input_file):
+    """
+    Reads result rows written by write_json.
+
+    :param input_file: name of the file to be read
+    :return: a list of result rows
+    """
+    with open(input_file) as f:
+        return json.load(f)['results']
+
+
+def main():
+    """
+    This script benchmarks heuristic combinations over one or more puzzle files.
+
+    Usage: python benchmark.py input_file [input_file ...] [--variable var_ids] [--value val_ids] [--engine engine_id]
+                               [--propagate propagation_level] [--repetitions count] [--warmup count] [--seed seed]
+                               [--limit count] [--node-limit count] [--json output_file] [--csv output_file]
+                               [--baseline baseline_file] [--threshold fraction]
+
+    input_file: puzzle file to benchmark on (any format read_puzzles detects)
+    var_ids, val_ids: comma separated heuristic identifiers to sweep (default: all of them)
+    engine_id: csp (default), native or dlx
+    propagation_level: fc (default), ac3, singles or pairs, for the csp engine
+    --repetitions: timed solves of every puzzle (default 3), --warmup: untimed solves per combination (default 1)
+    seed: base random seed of the repetitions (default 0)
+    --limit: only use the first count puzzles of every file
+    --node-limit: give up on a puzzle after expanding count nodes, reported as failed and capped (default 10000, 0
+                  for no limit)
+    --json / --csv: write the results to a file
+    baseline_file: JSON results of an earlier run, regressions are printed and make the script exit with status 1
+    fraction: relative slowdown of the median or p95 time counted as a regression (default 0.1)
+    """
+    corpora = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--'):
+            break
+        corpora.append(arg)
+
+    if not corpora:
+        print('Error: no input files.')
+        return
+
+    options = {}
+    for name, convert, default in (('--variable', str, ','.join(VARIABLE_HEURISTICS)),
+                                   ('--value', str, ','.join(VALUE_HEURISTICS)),
+                                   ('--engine', str, 'csp'), ('--propagate', str, 'fc'),
+                                   ('--repetitions', int, 3), ('--warmup', int, 1), ('--seed', int, 0),
+                                   ('--limit', int, None), ('--node-limit', int, NODE_LIMIT),
+                                   ('--json', str, None), ('--csv', str, None),
+                                   ('--baseline', str, None), ('--threshold', float, 0.1)):
+        if name in sys.argv:
+            try:
+                options[name] = convert(sys.argv[sys.argv.index(name) + 1])
+            except (ValueError, IndexError):
+                print('Error: bad {} option.'.format(name[2:]))
+                return
+        else:
+            options[name] = default
+
+    if options['--engine'] not in ENGINES:
+        print('Error: bad engine.')
+        return
+    if options['--propagate'] not in PROPAGATION_LEVELS:
+        print('Error: bad propagation level.')
+        return
+    if options['--repetitions'] < 1:
+        print('Error: bad repetitions option.')
+        return
+    if options['--node-limit'] < 0:
+        print('Error: bad node-limit option.')
+        return
+
+    rows = run_benchmark(corpora, options['--variable'].split(','), options['--value'].split(','),
+                         engine=options['--engine'], propagate=options['--propagate'],
+                         repetitions=options['--repetitions'], warmup=options['--warmup'], seed=options['--seed'],
+                         limit=options['--limit'], node_limit=options['--node-limit'] or None)
+
+    if options['--json']:
+        write_json(rows, options['--json'])
+    if options['--csv']:
+        write_csv(rows, options['--csv'])
+
+    if options['--baseline']:
+        regressions = compare(rows, load_results(options['--baseline']), options['--threshold'])
+        for row, statistic, old, new in regressions:
+            print('REGRESSION {corpus} {variable}/{value}: '.format(**row) +
+                  '{} {} -> {}'.format(statistic, old, new))
+        if regressions:
+            sys.exit(1)
+        print('No regressions against {}.'.format(options['--baseline']))
+
+
+if __name__ == '__main__':
+    main()
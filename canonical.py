@@ -0,0 +1,251 @@
+"""
+Canonical forms of sudoku puzzles and a solution cache keyed by them
+
+Relabeling the digits, permuting the rows within a band (or the columns within a stack), permuting the bands (or
+stacks) and transposing all turn a puzzle into an equivalent one, whose solution is the same transform of the
+original solution. A puzzle's canonical form is the lexicographically smallest grid among its transforms, with the
+digits relabeled in order of first appearance.
+
+Trying every transform is out of the question (there are 2 * 6^8 row and column orders alone for 9x9), so lines are
+first ordered by invariants that no transform changes (their number of clues, their clues per block, how often their
+digits occur in the whole puzzle), and only the orders of lines with equal invariants are enumerated, up to a cap.
+Puzzles that hit the cap still get a deterministic form and an exact transform, so the cache stays correct; only
+some equivalent puzzles may map to different forms.
+
+"""
+import hashlib
+import math
+import sqlite3
+
+from collections import OrderedDict, namedtuple
+from itertools import chain, groupby, islice, permutations, product
+
+CANDIDATE_CAP = 256     # most line orders compared per puzzle
+COMMIT_EVERY = 256      # solutions stored between commits of the database
+
+# a canonical form: the stable hash of the canonical grid, the grid itself and the transform that produces it
+CanonicalForm = namedtuple('CanonicalForm', ['key', 'grid', 'transform'])
+
+
+class Transform:
+    """A symmetry transform of sudoku grids: optional transposition, then a row and column order and digit labels."""
+
+    def __init__(self, transpose, rows, cols, labels):
+        """
+        :param transpose: whether the grid is transposed first
+        :param rows: the row of the (transposed) grid that goes to every row
+        :param cols: the column of the (transposed) grid that goes to every column
+        :param labels: the new label of every digit, labels[0] = 0 for empty squares
+        """
+        self.transpose = transpose
+        self.rows = rows
+        self.cols = cols
+        self.labels = labels
+
+    def apply(self, grid):
+        """
+        :param grid: a 2D array board
+        :return: the transformed board
+        """
+        if self.transpose:
+            grid = [list(col) for col in zip(*grid)]
+        labels = self.labels
+        return [[labels[grid[row][col]] for col in self.cols] for row in self.rows]
+
+    def invert(self, grid):
+        """
+        :param grid: a transformed 2D array board (e.g. the solution of a canonical form)
+        :return: the board before the transform
+        """
+        size = len(grid)
+        inverse = [0] * (size + 1)
+        for digit, label in enumerate(self.labels):
+            inverse[label] = digit
+
+        original = [[0] * size for _ in range(size)]
+        for r, row in enumerate(self.rows):
+            for c, col in enumerate(self.cols):
+                original[row][col] = inverse[grid[r][c]]
+
+        if self.transpose:
+            original = [list(col) for col in zip(*original)]
+        return original
+
+
+def _line_orders(lines, subsquare_size, frequency):
+    """
+    Candidate orders of the rows of a grid: bands and rows within bands sorted by invariants, every order of lines
+    with equal invariants included.
+
+    :return: a generator of tuples of row indices
+    """
+    def line_key(line):
+        blocks = sorted(sum(1 for value in line[start:start + subsquare_size] if value)
+                        for start in range(0, len(line), subsquare_size))
+        return (-sum(blocks), tuple(blocks), tuple(sorted(-frequency[value] for value in line if value)))
+
+    keys = [line_key(line) for line in lines]
+
+    def orders(items, key):
+        # every order of items sorted by key, permuting runs of equal keys
+        runs = [list(run) for _, run in groupby(sorted(items, key=key), key=key)]
+        return (tuple(chain.from_iterable(choice)) for choice in product(*(permutations(run) for run in runs)))
+
+    bands = [tuple(range(start, start + subsquare_size)) for start in range(0, len(lines), subsquare_size)]
+    row_orders = {band: list(islice(orders(band, keys.__getitem__), CANDIDATE_CAP)) for band in bands}
+
+    for band_order in orders(bands, lambda band: sorted(keys[row] for row in band)):
+        for rows in product(*(row_orders[band] for band in band_order)):
+            yield tuple(chain.from_iterable(rows))
+
+
+def _relabeled(grid, rows, cols, best):
+    """
+    The grid in a row and column order with digits relabeled by first appearance, or None as soon as it can't
+    compare less than best.
+    """
+    labels = {0: 0}
+    flat = []
+    smaller = best is None
+    for row in rows:
+        line = grid[row]
+        for col in cols:
+            value = line[col]
+            label = labels.get(value)
+            if label is None:
+                label = labels[value] = len(labels)
+            if not smaller:
+                if label > best[len(flat)]:
+                    return None
+                smaller = label < best[len(flat)]
+            flat.append(label)
+    return (flat, labels) if smaller else None
+
+
+def canonicalize(board):
+    """
+    Computes the canonical form of a board.
+
+    :param board: a Board (or 2D array board)
+    :return: a CanonicalForm
+    """
+    grid = board.board if hasattr(board, 'board') else board
+    size = len(grid)
+    subsquare_size = int(math.sqrt(size))
+
+    frequency = [0] * (size + 1)
+    for line in grid:
+        for value in line:
+            frequency[value] += 1
+
+    best = None
+    for transpose in (False, True):
+        source = [list(col) for col in zip(*grid)] if transpose else grid
+        columns = [list(col) for col in zip(*source)]
+
+        row_orders = list(islice(_line_orders(source, subsquare_size, frequency), CANDIDATE_CAP))
+        col_orders = list(islice(_line_orders(columns, subsquare_size, frequency), CANDIDATE_CAP))
+
+        for rows, cols in islice(product(row_orders, col_orders), CANDIDATE_CAP):
+            candidate = _relabeled(source, rows, cols, best[0] if best else None)
+            if candidate is not None:
+                best = candidate[0], transpose, rows, cols, candidate[1]
+
+    flat, transpose, rows, cols, found = best
+
+    # digits missing from the puzzle take the remaining labels in order
+    labels = [0] * (size + 1)
+    free = iter(label for label in range(1, size + 1) if label not in found.values())
+    for digit in range(1, size + 1):
+        labels[digit] = found[digit] if digit in found else next(free)
+
+    key = hashlib.sha1(bytes([size]) + bytes(flat)).hexdigest()
+    canonical = [flat[row * size:(row + 1) * size] for row in range(size)]
+    return CanonicalForm(key, canonical, Transform(transpose, rows, cols, labels))
+
+
+class SolutionCache:
+    """
+    Solutions of canonical forms, in a least recently used in-memory layer and optionally an sqlite3 database.
+
+    A solution is stored in the frame of the canonical form and mapped back through the inverse transform of the
+    puzzle it is looked up for, so it serves every equivalent puzzle.
+    """
+
+    def __init__(self, capacity=4096, path=None):
+        """
+        :param capacity: the most solutions kept in memory
+        :param path: optional name of an sqlite3 database file persisting every solution
+        """
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()       # key -> canonical solution as bytes, least recently used first
+        self._db = None
+        self._uncommitted = 0
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            self._db.execute('CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, solution BLOB)')
+
+    def get(self, form):
+        """
+        Looks up the solution of a puzzle.
+
+        :param form: the CanonicalForm of the puzzle
+        :return: the solution as a 2D array board in the frame of the puzzle, or None if it's not cached
+        """
+        solution = self._memory.get(form.key)
+
+        if solution is not None:
+            self._memory.move_to_end(form.key)
+        elif self._db is not None:
+            row = self._db.execute('SELECT solution FROM solutions WHERE key = ?', (form.key,)).fetchone()
+            if row is not None:
+                solution = bytes(row[0])
+                self._remember(form.key, solution)
+
+        if solution is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        size = len(form.grid)
+        return form.transform.invert([list(solution[row * size:(row + 1) * size]) for row in range(size)])
+
+    def put(self, form, solution):
+        """
+        Stores the solution of a puzzle.
+
+        :param form: the CanonicalForm of the puzzle
+        :param solution: the solution as a 2D array board in the frame of the puzzle
+        """
+        canonical = bytes(value for row in form.transform.apply(solution) for value in row)
+        self._remember(form.key, canonical)
+        if self._db is not None:
+            self._db.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?)', (form.key, canonical))
+            self._uncommitted += 1
+            if self._uncommitted >= COMMIT_EVERY:
+                self._db.commit()
+                self._uncommitted = 0
+
+    def _remember(self, key, solution):
+        self._memory[key] = solution
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def close(self):
+        """
+        Commits and closes the database, if any.
+        """
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,167 @@
+"""
+Checkpoints of long batch runs
+
+A checkpoint records which puzzles of an input are finished (as sorted ranges of indices) and how many bytes of the
+output file hold their results. It is saved every so many results or seconds, after flushing the output, by writing
+a temporary file and renaming it over the previous checkpoint, so a run killed at any moment leaves a complete
+checkpoint behind. Resuming truncates the output to the recorded size, dropping anything written after the last
+checkpoint, appends to it, and skips the finished puzzles.
+
+"""
+import json
+import os
+
+from bisect import bisect_right
+from time import perf_counter
+
+VERSION = 1
+CHECKPOINT_EVERY = 256      # results between checkpoints
+CHECKPOINT_SECONDS = 30.0   # seconds between checkpoints
+
+
+class Checkpoint:
+    """Finished puzzle indices and output size of a batch run, saved atomically to a JSON file."""
+
+    def __init__(self, path, meta=None, every=CHECKPOINT_EVERY, seconds=CHECKPOINT_SECONDS):
+        """
+        :param path: name of the checkpoint file
+        :param meta: a dict describing the run (e.g. its input and output files), checked when resuming
+        :param every: save after this many new results
+        :param seconds: save when a result arrives this long after the last save
+        """
+        self.path = path
+        self.meta = dict(meta or {})
+        self.every = every
+        self.seconds = seconds
+        self.offset = 0         # bytes of the output holding the results of the finished puzzles
+
+        self._starts = []       # finished indices as disjoint ranges [start, stop), sorted
+        self._stops = []
+        self._unsaved = 0
+        self._saved_at = perf_counter()
+
+    @classmethod
+    def load(cls, path, every=CHECKPOINT_EVERY, seconds=CHECKPOINT_SECONDS):
+        """
+        Reads a saved checkpoint.
+
+        :param path: name of the checkpoint file
+        :param every: save after this many new results
+        :param seconds: save when a result arrives this long after the last save
+        :return: the Checkpoint
+        """
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('version') != VERSION:
+            raise ValueError('{} is not a version {} checkpoint'.format(path, VERSION))
+
+        checkpoint = cls(path, state['meta'], every, seconds)
+        checkpoint.offset = state['offset']
+        for start, stop in state['done']:
+            checkpoint._starts.append(start)
+            checkpoint._stops.append(stop)
+        return checkpoint
+
+    def __len__(self):
+        return sum(stop - start for start, stop in zip(self._starts, self._stops))
+
+    def done(self, index):
+        """
+        :param index: the position of a puzzle in the input
+        :return: whether the puzzle is finished
+        """
+        k = bisect_right(self._starts, index)
+        return k > 0 and index < self._stops[k - 1]
+
+    def missing(self, stop):
+        """
+        :param stop: the number of puzzles in the input
+        :return: a list of (start, stop) ranges of the puzzles that are not finished, in order
+        """
+        spans = []
+        start = 0
+        for done_start, done_stop in zip(self._starts, self._stops):
+            if done_start >= stop:
+                break
+            if start < done_start:
+                spans.append((start, done_start))
+            start = done_stop
+        if start < stop:
+            spans.append((start, stop))
+        return spans
+
+    def add(self, index):
+        """
+        Marks a puzzle as finished.
+
+        :param index: the position of the puzzle in the input
+        """
+        starts, stops = self._starts, self._stops
+        k = bisect_right(starts, index)
+        if k > 0 and index < stops[k - 1]:
+            return
+
+        extends_left = k > 0 and stops[k - 1] == index
+        extends_right = k < len(starts) and starts[k] == index + 1
+
+        if extends_left and extends_right:
+            stops[k - 1] = stops[k]
+            del starts[k], stops[k]
+        elif extends_left:
+            stops[k - 1] = index + 1
+        elif extends_right:
+            starts[k] = index
+        else:
+            starts.insert(k, index)
+            stops.insert(k, index + 1)
+
+    def record(self, index, sink=None):
+        """
+        Marks a puzzle as finished after its result was written, saving the checkpoint when one is due.
+
+        :param index: the position of the puzzle in the input
+        :param sink: the result sink of the run, if any
+        """
+        self.add(index)
+        self._unsaved += 1
+        if self._unsaved >= self.every or perf_counter() - self._saved_at >= self.seconds:
+            self.save(sink)
+
+    def save(self, sink=None):
+        """
+        Flushes the sink and atomically replaces the checkpoint file.
+
+        :param sink: the result sink of the run, if any
+        """
+        if sink is not None:
+            self.offset = sink.flush()
+
+        state = {'version': VERSION, 'meta': self.meta, 'offset': self.offset,
+                 'done': [[start, stop] for start, stop in zip(self._starts, self._stops)]}
+
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+        self._unsaved = 0
+        self._saved_at = perf_counter()
+
+
+def truncate_output(path, offset):
+    """
+    Cuts an output file back to the size recorded by a checkpoint, so a resumed run can append to it.
+
+    :param path: name of the output file
+    :param offset: the size recorded by the checkpoint
+    """
+    if not os.path.exists(path):
+        if offset:
+            raise ValueError('{} is missing, it should hold {} bytes of results'.format(path, offset))
+        return
+
+    if os.path.getsize(path) < offset:
+        raise ValueError('{} is shorter than its checkpoint ({} bytes)'.format(path, offset))
+    os.truncate(path, offset)
@@ -1,7 +1,49 @@
 import math
+import numbers
+
+from collections import namedtuple
 
 DEFAULT_SIZE = 9        # standard sudoku size
 
+# index tables of one board size: the squares of every row, column and subsquare (units lists all of them), the
+# peers of every square, and the row/column/subsquare every square belongs to
+UnitTables = namedtuple('UnitTables', ['rows', 'cols', 'subsquares', 'units', 'peers',
+                                       'row_of', 'col_of', 'subsquare_of'])
+
+_unit_tables = {}       # board size -> UnitTables, filled in by unit_tables
+
+
+def unit_tables(board_size):
+    """
+    Return the index tables for a board size, computing them on first use.
+
+    :param board_size: the side length of the board (n^2)
+    :return: the UnitTables of that size
+    """
+    tables = _unit_tables.get(board_size)
+
+    if tables is None:
+        subsquare_size = int(math.sqrt(board_size))
+        squares = range(board_size ** 2)
+
+        row_of = tuple(index // board_size for index in squares)
+        col_of = tuple(index % board_size for index in squares)
+        subsquare_of = tuple((col_of[index] // subsquare_size) + subsquare_size * (row_of[index] // subsquare_size)
+                             for index in squares)
+
+        rows = tuple(tuple(index for index in squares if row_of[index] == i) for i in range(board_size))
+        cols = tuple(tuple(index for index in squares if col_of[index] == i) for i in range(board_size))
+        subsquares = tuple(tuple(index for index in squares if subsquare_of[index] == i) for i in range(board_size))
+
+        peers = tuple(tuple(sorted((set(rows[row_of[index]]) | set(cols[col_of[index]]) |
+                                    set(subsquares[subsquare_of[index]])) - {index}))
+                      for index in squares)
+
+        tables = UnitTables(rows, cols, subsquares, rows + cols + subsquares, peers, row_of, col_of, subsquare_of)
+        _unit_tables[board_size] = tables
+
+    return tables
+
 
 class Board:
     """Class representing a sudoku board."""
@@ -16,6 +58,7 @@ class Board:
         self.board_size = len(preset)
         self.subsquare_size = int(math.sqrt(self.board_size))
         self.board = preset
+        self.tables = unit_tables(self.board_size)
 
     def __str__(self):
         """
@@ -24,10 +67,11 @@ class Board:
         :return a printable representation of the board
         """
         string_board = ''
+        board = self.board
 
         for row in range(self.board_size):
             for col in range(self.board_size):
-                val = self.board[row][col]
+                val = board[row][col]
 
                 string_board += ' '
 
@@ -90,8 +134,8 @@ class Board:
         :param row: the index of the row
         :return either an empty list (invalid input) or a list of entries in the row
         """
-        if row <= self.board_size:
-            return list(zip([Board.coords_to_index(self.board_size, row, x) for x in range(self.board_size)], self.board[row]))
+        if row < self.board_size:
+            return list(zip(self.tables.rows[row], self.board[row]))
         else:
             return []
 
@@ -102,8 +146,8 @@ class Board:
         :param col: the index of the column
         :return either an empty list (invalid input) or a list of entries in the column
         """
-        if col <= self.board_size:
-            return list(zip([Board.coords_to_index(self.board_size, x, col) for x in range(self.board_size)], [el[col] for el in self.board]))
+        if col < self.board_size:
+            return list(zip(self.tables.cols[col], [el[col] for el in self.board]))
         else:
             return []
 
@@ -112,17 +156,13 @@ class Board:
         Return list of entries in subsquare of index sq (0...size-1).
 
         :param sq_index: the index of the subsquare
-        :return a list of entries in the subsquare
+        :return either an empty list (invalid input) or a list of entries in the subsquare
         """
-
-        sq = []
-
-        for row in range(self.board_size):
-            for col in range(self.board_size):
-                if Board.subsquare_index(self, row, col) == sq_index:
-                    sq.append((Board.coords_to_index(self.board_size, row, col), self.board[row][col]))
-
-        return sq
+        if sq_index < self.board_size:
+            return [(index, self.board[index // self.board_size][index % self.board_size])
+                    for index in self.tables.subsquares[sq_index]]
+        else:
+            return []
 
     def get_value(self, location):
         """
@@ -170,23 +210,188 @@ class Board:
 
         :return whether the board is consistent
         """
-        for i in range(self.board_size):
-            # check rows
-            r = list(filter(lambda x: x != 0, self.row(i)))
+        for unit in self.tables.units:
+            # check rows, columns and subsquares for repeated values
+            values = [self.get_value(index) for index in unit]
+            values = [value for value in values if value != 0]
 
-            if len(r) != len(set(r)):
+            if len(values) != len(set(values)):
                 return False
 
-            # check columns
-            c = list(filter(lambda x: x != 0, self.col(i)))
+        return True
 
-            if len(c) != len(set(c)):
-                return False
 
-            # check subsquares
-            sq = list(filter(lambda x: x != 0, self.subsquare(i + 1)))
+class CompactBoard:
+    """
+    Sudoku board stored as one flat bytearray of squares in row major order (0 for an empty square), with the
+    interface of Board.
+
+    A CompactBoard takes a fraction of the memory of a Board and needs no allocation to read or write a square, copy
+    its state out (snapshot) or back in (restore), or look at a row, column or subsquare through a memoryview. The
+    board attribute still works for callers of Board, but builds a new 2D array on every access, so writes to it are
+    lost.
+    """
+
+    __slots__ = ('board_size', 'subsquare_size', 'tables', 'cells')
+
+    def __init__(self, preset):
+        """
+        Constructor for the board.
+
+        :param preset: n^2 x n^2 (n=1,2,...) 2D array containing the initial values of the board, the n^4 values as
+                       a flat sequence or bytes-like object (e.g. a view into a binary corpus, which is copied), a
+                       1D or 2D NumPy array of integers, or a Board
+        """
+        if hasattr(preset, 'board'):
+            preset = preset.board
+
+        if len(preset) and not isinstance(preset[0], numbers.Integral):
+            self.cells = bytearray(value for row in preset for value in row)
+            self.board_size = len(preset)
+        else:
+            # only bytes are copied as they are, the buffer of an array of wider integers holds more than one byte
+            # per value
+            if isinstance(preset, (bytes, bytearray, memoryview)):
+                self.cells = bytearray(preset)
+            else:
+                self.cells = bytearray(iter(preset))
+            self.board_size = math.isqrt(len(self.cells))
+
+        self.subsquare_size = int(math.sqrt(self.board_size))
+        self.tables = unit_tables(self.board_size)
+
+    @property
+    def board(self):
+        """
+        :return: a new 2D array of the values of the board
+        """
+        size = self.board_size
+        cells = self.cells
+        return [list(cells[row * size:(row + 1) * size]) for row in range(size)]
+
+    def __reduce__(self):
+        # the unit tables are shared per size, only pickle the values
+        return CompactBoard, (bytes(self.cells),)
+
+    __str__ = Board.__str__
+    index_to_coords = staticmethod(Board.index_to_coords)
+    coords_to_index = staticmethod(Board.coords_to_index)
+    subsquare_index = staticmethod(Board.subsquare_index)
+    check_valid = Board.check_valid
+
+    def row(self, row):
+        """
+        Return list of entries in row of board (0...size-1).
+
+        :param row: the index of the row
+        :return either an empty list (invalid input) or a list of entries in the row
+        """
+        if row < self.board_size:
+            return list(zip(self.tables.rows[row], self.row_view(row)))
+        else:
+            return []
+
+    def col(self, col):
+        """
+        Return list of entries in col of board (0...size-1).
+
+        :param col: the index of the column
+        :return either an empty list (invalid input) or a list of entries in the column
+        """
+        if col < self.board_size:
+            return list(zip(self.tables.cols[col], self.col_view(col)))
+        else:
+            return []
+
+    def subsquare(self, sq_index):
+        """
+        Return list of entries in subsquare of index sq (0...size-1).
+
+        :param sq_index: the index of the subsquare
+        :return either an empty list (invalid input) or a list of entries in the subsquare
+        """
+        if sq_index < self.board_size:
+            cells = self.cells
+            return [(index, cells[index]) for index in self.tables.subsquares[sq_index]]
+        else:
+            return []
+
+    def row_view(self, row):
+        """
+        :param row: the index of the row (0...size-1)
+        :return: a memoryview of the values of the row
+        """
+        return memoryview(self.cells)[row * self.board_size:(row + 1) * self.board_size]
+
+    def col_view(self, col):
+        """
+        :param col: the index of the column (0...size-1)
+        :return: a (strided) memoryview of the values of the column
+        """
+        return memoryview(self.cells)[col::self.board_size]
+
+    def subsquare_view(self, sq_index):
+        """
+        :param sq_index: the index of the subsquare (0...size-1)
+        :return: a tuple of memoryviews of the values of every row of the subsquare
+        """
+        size, subsquare_size = self.board_size, self.subsquare_size
+        start = (sq_index // subsquare_size) * subsquare_size * size + (sq_index % subsquare_size) * subsquare_size
+        view = memoryview(self.cells)
+        return tuple(view[offset:offset + subsquare_size]
+                     for offset in range(start, start + subsquare_size * size, size))
+
+    def get_value(self, location):
+        """
+        Return the value stored in the coordinate tuple.
 
-            if len(sq) != len(set(sq)):
+        :param location: either (row, col) tuple, where row, col < board size or an index (0...size^2)
+        :return the value at the location, or 0 otherwise
+        """
+        if type(location) is int:
+            return self.cells[location] if location < len(self.cells) else 0
+
+        row, col = location
+        if row < self.board_size and col < self.board_size:
+            return self.cells[row * self.board_size + col]
+
+        return 0
+
+    def set_value(self, location, new_value):
+        """
+        Set the value at the location to a new value.
+
+        :param location: either (row, col) tuple, where row, col < board size or an index (0...size^2)
+        :param new_value: the new value to be stored at the location
+        :return: success flag
+        """
+        if type(location) is not int:
+            row, col = location
+            if row >= self.board_size or col >= self.board_size:
                 return False
+            location = row * self.board_size + col
+        elif location >= len(self.cells):
+            return False
 
+        self.cells[location] = new_value
         return True
+
+    def snapshot(self):
+        """
+        :return: the values of the board as bytes, for restore
+        """
+        return bytes(self.cells)
+
+    def restore(self, snapshot):
+        """
+        Sets the values of the board back to a snapshot, in place.
+
+        :param snapshot: bytes returned by snapshot (or any n^4 values)
+        """
+        self.cells[:] = snapshot
+
+    def copy(self):
+        """
+        :return: a CompactBoard with the same values
+        """
+        return CompactBoard(self.cells)
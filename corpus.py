@@ -0,0 +1,244 @@
+"""
+Packed binary container for sudoku puzzle corpora
+
+A corpus file is a 32 byte header followed by fixed size records, one per puzzle:
+
+    header: magic b'SDKC', version (u16), flags (u16), board size (u16), reserved (u16), puzzle count (u64), padding
+    record: board size^2 squares of one byte each (0 for an empty square), in row major order, followed by the
+            squares of the solution if the SOLUTIONS flag is set
+
+The reader maps the file into memory, so a puzzle is a zero-copy view into the file and any number of processes can
+open the same corpus and take slices of it without parsing anything.
+
+"""
+import mmap
+import struct
+
+from classes import CompactBoard
+
+MAGIC = b'SDKC'
+VERSION = 1
+SOLUTIONS = 0x1     # flag: every record also stores the solution of its puzzle
+
+_HEADER = struct.Struct('<4sHHHHQ12x')
+
+
+def is_corpus(path):
+    """
+    Return whether a file is a binary puzzle corpus.
+
+    :param path: name of the file
+    :return: whether the file starts with the corpus magic
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class CorpusWriter:
+    """Writes puzzles (and optionally their solutions) to a binary corpus file."""
+
+    def __init__(self, path, board_size, solutions=False, append=False):
+        """
+        :param path: name of the file to be written
+        :param board_size: the side length of the boards (n^2)
+        :param solutions: whether a solution is stored with every puzzle
+        :param append: whether to add to an existing corpus (its count is taken from the size of the file, and an
+                       incomplete last record is dropped) instead of starting a new one
+        """
+        self.board_size = board_size
+        self.has_solutions = solutions
+        self.count = 0
+
+        if append:
+            self._file = open(path, 'r+b')
+            self._open_existing(path)
+        else:
+            self._file = open(path, 'wb')
+            self._write_header()
+
+    def _open_existing(self, path):
+        header = self._file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            # nothing useful was written yet
+            self._file.seek(0)
+            self._file.truncate()
+            self._write_header()
+            return
+
+        magic, version, flags, board_size, _, _ = _HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            self._file.close()
+            raise ValueError('{} is not a version {} puzzle corpus'.format(path, VERSION))
+        if board_size != self.board_size or bool(flags & SOLUTIONS) != self.has_solutions:
+            self._file.close()
+            raise ValueError('{} stores different boards'.format(path))
+
+        record_size = self.board_size ** 2 * (2 if self.has_solutions else 1)
+        self.count = (self._file.seek(0, 2) - _HEADER.size) // record_size
+        self._file.truncate(_HEADER.size + self.count * record_size)
+        self._file.seek(0, 2)
+
+    def _write_header(self):
+        flags = SOLUTIONS if self.has_solutions else 0
+        self._file.write(_HEADER.pack(MAGIC, VERSION, flags, self.board_size, 0, self.count))
+
+    def write(self, puzzle, solution=None):
+        """
+        Appends a puzzle to the corpus.
+
+        :param puzzle: a 2D array board
+        :param solution: a solved 2D array board (required if the corpus stores solutions, ignored otherwise)
+        """
+        if len(puzzle) != self.board_size:
+            raise ValueError('Expected a {0}x{0} board'.format(self.board_size))
+
+        self._file.write(bytes(value for row in puzzle for value in row))
+
+        if self.has_solutions:
+            if solution is None:
+                raise ValueError('This corpus stores a solution with every puzzle')
+            self._file.write(bytes(value for row in solution for value in row))
+
+        self.count += 1
+
+    def flush(self):
+        """
+        Records the current puzzle count in the header and flushes the file, leaving a complete corpus on disk.
+
+        :return: the size of the file in bytes
+        """
+        self._file.seek(0)
+        self._write_header()
+        self._file.seek(0, 2)
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        """
+        Records the final puzzle count in the header and closes the file.
+        """
+        if not self._file.closed:
+            self._file.seek(0)
+            self._write_header()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BinaryCorpus:
+    """
+    Memory-mapped, read-only view of a binary corpus file.
+
+    Pickling a corpus only pickles its path, so a worker process receiving one maps the same file itself.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: name of the corpus file
+        """
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, self.board_size, _, self.count = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError('{} is not a version {} puzzle corpus'.format(path, VERSION))
+
+        self.has_solutions = bool(flags & SOLUTIONS)
+        self._squares = self.board_size ** 2
+        self._record_size = self._squares * (2 if self.has_solutions else 1)
+        self._view = memoryview(self._map)[_HEADER.size:_HEADER.size + self.count * self._record_size]
+
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self.boards()
+
+    def puzzle_view(self, index):
+        """
+        Return the squares of a puzzle without copying them.
+
+        :param index: the position of the puzzle in the corpus
+        :return: a memoryview of board size^2 bytes, in row major order
+        """
+        if not 0 <= index < self.count:
+            raise IndexError('puzzle index out of range')
+        start = index * self._record_size
+        return self._view[start:start + self._squares]
+
+    def solution_view(self, index):
+        """
+        Return the squares of the stored solution of a puzzle without copying them.
+
+        :param index: the position of the puzzle in the corpus
+        :return: a memoryview of board size^2 bytes, in row major order
+        """
+        if not self.has_solutions:
+            raise ValueError('{} does not store solutions'.format(self.path))
+        if not 0 <= index < self.count:
+            raise IndexError('puzzle index out of range')
+        start = index * self._record_size + self._squares
+        return self._view[start:start + self._squares]
+
+    def puzzle(self, index):
+        """
+        :param index: the position of the puzzle in the corpus
+        :return: the puzzle as a 2D array board
+        """
+        return self._to_board(self.puzzle_view(index))
+
+    def solution(self, index):
+        """
+        :param index: the position of the puzzle in the corpus
+        :return: the stored solution as a 2D array board
+        """
+        return self._to_board(self.solution_view(index))
+
+    def board(self, index):
+        """
+        :param index: the position of the puzzle in the corpus
+        :return: the puzzle as a CompactBoard (a single copy of its squares)
+        """
+        return CompactBoard(self.puzzle_view(index))
+
+    def _to_board(self, view):
+        size = self.board_size
+        return [list(view[row * size:(row + 1) * size]) for row in range(size)]
+
+    def boards(self, start=0, stop=None):
+        """
+        Lazily yields a slice of the puzzles.
+
+        :param start: position of the first puzzle
+        :param stop: position after the last puzzle (default: the end of the corpus)
+        :return: a generator of 2D array boards
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        for index in range(start, stop):
+            yield self.puzzle(index)
+
+    def close(self):
+        """
+        Unmaps the file. Views handed out before must not be used anymore.
+        """
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
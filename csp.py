@@ -27,18 +27,27 @@
 
 from __future__ import absolute_import, division, print_function
 
-from heuristics import variable_heuristic, value_heuristic
-from constraint import Solver
+import random
+
+from time import perf_counter
+
+from heuristics import variable_heuristic, value_heuristic, VariableQueue, ValueCounter, QUEUED_HEURISTICS, \
+    COUNTED_HEURISTICS, RANDOMIZED_VARIABLE_HEURISTICS, RANDOMIZED_VALUE_HEURISTICS
+from inference import Propagator, PROPAGATION_LEVELS
+from nogoods import NogoodStore
+from restarts import restart_budgets, RESTART_SCHEDULES
+from stats import SearchStats
+from constraint import AllDifferentConstraint, Solver
 
 
 class HeuristicRecursiveBacktrackingSolver(Solver):
     """
-    Recursive problem solver with backtracking capabilities
+    Problem solver with backtracking capabilities (searching with an explicit stack)
     Examples:
     >>> result = [[('a', 1), ('b', 2)],
     ...           [('a', 1), ('b', 3)],
     ...           [('a', 2), ('b', 3)]]
-    >>> problem = Problem(RecursiveBacktrackingSolver())
+    >>> problem = Problem(HeuristicRecursiveBacktrackingSolver())
     >>> problem.addVariables(["a", "b"], [1, 2, 3])
     >>> problem.addConstraint(lambda a, b: b > a, ["a", "b"])
     >>> solution = problem.getSolution()
@@ -49,13 +58,16 @@ class HeuristicRecursiveBacktrackingSolver(Solver):
     True
     True
     True
-    >>> problem.getSolutionIter()
-    Traceback (most recent call last):
-       ...
-    NotImplementedError: RecursiveBacktrackingSolver doesn't provide iteration
+    >>> for solution in problem.getSolutionIter():
+    ...     sorted(solution.items()) in result
+    True
+    True
+    True
     """
 
-    def __init__(self, value_heuristic_id=None, variable_heuristic_id=None, forwardcheck=True):
+    def __init__(self, value_heuristic_id=None, variable_heuristic_id=None, forwardcheck=True, propagate='fc',
+                 stats=False, restarts=None, restart_base=100, restart_factor=2.0, seed=None, backjump=False,
+                 nogoods=0, node_limit=None):
         """
         @param variable_heuristic: string identifier of the variable heuristic to use
                                    choose from {degree, mrv, random, deg+mrv, mrv+random}
@@ -69,71 +81,493 @@ class HeuristicRecursiveBacktrackingSolver(Solver):
                              to constraints while looking for solutions
                              (default is true)
         @type  forwardcheck: bool
+
+        @param propagate: string identifier of the propagation run after every assignment
+                          choose from {fc, ac3, singles, pairs} (see inference.py)
+                          stronger levels require forward checking
+
+        @param stats: If true, every search records a SearchStats in the
+                      stats attribute (default is false)
+        @type  stats: bool
+
+        @param restarts: restart schedule of getSolution, choose from
+                         {luby, geometric} (see restarts.py); every run is
+                         cut off after its node budget and the search starts
+                         over with the random module reseeded; requires a
+                         randomized variable heuristic {random, mrv+random}
+                         or value heuristic {random}
+                         leave blank to never restart
+
+        @param restart_base: node budget of the first run (default is 100)
+
+        @param restart_factor: growth of the geometric budgets (default is 2)
+
+        @param seed: If given, the random module is seeded with it before
+                     every search and with seed + k before the k-th restart,
+                     so randomized heuristics are reproducible
+
+        @param backjump: If true, a variable that runs out of values jumps
+                         back to the deepest variable of its conflict set
+                         (conflict-directed backjumping) instead of the
+                         previous one; requires the fc propagation level and
+                         only applies to problems made of all-different
+                         constraints (default is false)
+        @type  backjump: bool
+
+        @param nogoods: capacity of the store of nogoods learned from the
+                        conflict sets when backjumping (default is 0, learn
+                        none)
+
+        @param node_limit: If given, getSolution gives up (returns None and
+                           sets cutoff) after expanding this many nodes, over
+                           all runs when restarting
         """
+        if propagate not in PROPAGATION_LEVELS:
+            raise ValueError('Unknown propagation level {!r}, choose from {}'.format(propagate, PROPAGATION_LEVELS))
+        if propagate != 'fc' and not forwardcheck:
+            raise ValueError('Propagation level {!r} requires forward checking'.format(propagate))
+        if restarts is not None and restarts not in RESTART_SCHEDULES:
+            raise ValueError('Unknown restart schedule {!r}, choose from {}'.format(restarts, RESTART_SCHEDULES))
+        if restarts is not None and variable_heuristic_id not in RANDOMIZED_VARIABLE_HEURISTICS and \
+                value_heuristic_id not in RANDOMIZED_VALUE_HEURISTICS:
+            raise ValueError('Restarts require a randomized variable or value heuristic, every run would repeat the '
+                             'same search')
+        if restart_base < 1 or restart_factor < 1:
+            raise ValueError('Restart budgets must be at least 1 node and must not shrink')
+        if backjump and propagate != 'fc':
+            raise ValueError('Backjumping requires the fc propagation level')
+        if nogoods and not backjump:
+            raise ValueError('Learning nogoods requires backjumping')
+        if node_limit is not None and node_limit < 1:
+            raise ValueError('A node limit must be at least 1 node')
+
         self._forwardcheck = forwardcheck
+        self._propagate = propagate
 
         self._variable_heuristic_id = variable_heuristic_id
         self._value_heuristic_id = value_heuristic_id
 
-    def recursiveBacktracking(
-        self, solutions, domains, vconstraints, assignments, single
-    ):
+        self._queue = None
+        self._counter = None
+        self._propagator = None
+        self._neighbours = None
+        self._neighbours_source = None
 
-        # assignments is a dictionary of {variable: value, ...}
+        self._collect_stats = stats
+        self.stats = None
 
-        ##############################################################
-        # Use different heuristics for selecting unassigned variable #
-        ##############################################################
-        lst = variable_heuristic(domains, vconstraints, self._variable_heuristic_id)
+        self._restarts = restarts
+        self._restart_base = restart_base
+        self._restart_factor = restart_factor
+        self._seed = seed
+        self._node_limit = node_limit
+        self._cutoff = False
 
-        for item in lst:
-            if item[-1] not in assignments:
-                # Found an unassigned variable. Let's go.
-                break
+        self._backjump = backjump
+        self._nogood_capacity = nogoods
+        self._alldifferent = False
+        self._initial = None
+        self._nogoods = None
+
+    def startSearch(self, domains, vconstraints):
+        """
+        Sets up the incremental bookkeeping used by recursiveBacktracking for a new problem, and propagates the
+        initial domains if a propagation level is set.
+
+        @return: False if propagation already proves that the problem has no solution
+        """
+        self.stats = SearchStats() if self._collect_stats else None
+
+        if self._seed is not None:
+            random.seed(self._seed)
+
+        # problems sharing a compiled constraint graph (see helper_functions.problem_template) share neighbours
+        if vconstraints is not self._neighbours_source:
+            self._neighbours = {
+                variable: set(x for constraint, variables in vconstraints[variable] for x in variables) - {variable}
+                for variable in domains
+            }
+            self._neighbours_source = vconstraints
+            # conflict sets are only derived for the pairwise differences of all-different constraints
+            self._alldifferent = all(isinstance(constraint, AllDifferentConstraint)
+                                     for variable in domains for constraint, variables in vconstraints[variable])
+
+        if self._propagate != 'fc':
+            self._propagator = Propagator(self._propagate, domains, vconstraints)
+            # the root prunes are never undone, as they hold for every solution
+            start = perf_counter()
+            consistent, _ = self._propagator.propagate(domains, domains, {})
+            if self.stats is not None:
+                self.stats.propagation_seconds += perf_counter() - start
         else:
-            # No unassigned variables. We've got a solution.
-            solutions.append(assignments.copy())
-            return solutions
+            self._propagator = None
+            consistent = True
 
-        variable = item[-1]
-        assignments[variable] = None
+        if self._variable_heuristic_id in QUEUED_HEURISTICS:
+            self._queue = VariableQueue(domains, vconstraints, self._variable_heuristic_id)
+        else:
+            self._queue = None
 
-        forwardcheck = self._forwardcheck
-        if forwardcheck:
-            pushdomains = [domains[x] for x in domains if x not in assignments]
+        if self._value_heuristic_id in COUNTED_HEURISTICS:
+            self._counter = ValueCounter(domains, track_domains=self._value_heuristic_id == 'lcv')
+        else:
+            self._counter = None
+
+        if self._backjump and self._alldifferent:
+            # the domains as the search starts: values missing from them are pruned for good, not by an assignment
+            self._initial = {variable: set(domains[variable]) for variable in domains}
+            self._nogoods = NogoodStore(self._nogood_capacity) if self._nogood_capacity else None
         else:
-            pushdomains = None
+            self._initial = None
+            self._nogoods = None
 
-        ################################################
-        # Change heuristics for order of domain values #
-        ################################################
-        newlst = value_heuristic(assignments, domains, domains[variable], self._value_heuristic_id)
+        return consistent
 
-        for value in newlst:
-            assignments[variable] = value
-            if pushdomains:
-                for domain in pushdomains:
-                    domain.pushState()
-            for constraint, variables in vconstraints[variable]:
-                if not constraint(variables, domains, assignments, pushdomains):
-                    # Value is not good.
+    def refreshNeighbours(self, variable, domains, assignments, propagated=()):
+        """
+        Reports the domains of the unassigned neighbours of variable (the only domains that forward checking
+        may have pruned or restored) and of the variables pruned by propagation to the variable queue and the
+        value counter.
+        """
+        queue = self._queue
+        counter = self._counter
+        if queue is not None or counter is not None:
+            stats = self.stats
+            if stats is not None:
+                start = perf_counter()
+            neighbours = self._neighbours[variable]
+            if propagated:
+                neighbours = neighbours | propagated
+            neighbours = [x for x in neighbours if x not in assignments]
+            if queue is not None:
+                for neighbour in neighbours:
+                    queue.update(neighbour, len(domains[neighbour]))
+            if counter is not None:
+                counter.refresh(neighbours, domains)
+            if stats is not None:
+                stats.refresh_seconds += perf_counter() - start
+
+    def backtrackingSearch(self, domains, vconstraints, assignments, node_limit=None):
+        """
+        Heuristic backtracking search with an explicit stack instead of one recursive call per variable, so the
+        depth of the search is not bounded by the recursion limit.
+
+        Every frame of the stack is a list [variable, values to try, position of the next value, pushed domains,
+        variables pruned by propagation, whether a value is currently assigned, conflict set]. The search makes
+        exactly the choices (and records exactly the statistics) of one recursive call per frame.
+
+        When backjumping, the conflict set of a frame collects the assigned variables that explain why its values
+        failed: the neighbours whose values forward checking pruned from its domain, from the domain a value wiped
+        out, or from a stored nogood, plus the conflict sets of the frames that jumped back to it. A frame out of
+        values jumps back to the deepest variable of its conflict set (and records its conflict set as a nogood),
+        as the variables in between can't change the outcome. Once a solution was found, conflict sets don't
+        explain every failure anymore, so the search falls back to chronological backtracking.
+
+        @param node_limit: If given, the search is cut off when it is about
+                           to expand more nodes: every assignment is undone
+                           and the cutoff attribute is set
+        @return: a generator of the solutions; each one is the assignments dict itself, so consumers copy it
+        """
+        stats = self.stats
+        queue = self._queue
+        counter = self._counter
+        propagator = self._propagator
+        forwardcheck = self._forwardcheck
+        backjump = self._initial is not None
+        nogoods = self._nogoods
+
+        stack = []
+        depths = {}     # stack position of the variable of every frame
+        descend = True
+        nodes = 0
+        self._cutoff = False
+
+        while True:
+            if descend:
+                if node_limit is not None:
+                    if nodes == node_limit:
+                        self.unwind(stack, domains, assignments)
+                        self._cutoff = True
+                        return
+                    nodes += 1
+                if stats is not None:
+                    stats.nodes += 1
+                    if len(assignments) > stats.max_depth:
+                        stats.max_depth = len(assignments)
+                    start = perf_counter()
+
+                ##############################################################
+                # Use different heuristics for selecting unassigned variable #
+                ##############################################################
+                if queue is not None:
+                    variable = queue.peek()
+                    if variable is not None:
+                        queue.remove(variable)
+                else:
+                    lst = variable_heuristic(domains, vconstraints, self._variable_heuristic_id)
+
+                    for item in lst:
+                        if item[-1] not in assignments:
+                            # Found an unassigned variable. Let's go.
+                            variable = item[-1]
+                            break
+                    else:
+                        variable = None
+
+                if variable is None:
+                    # No unassigned variables. We've got a solution.
+                    yield assignments
+                    backjump = False
+                else:
+                    if stats is not None:
+                        stats.variable_seconds += perf_counter() - start
+
+                    assignments[variable] = None
+
+                    if forwardcheck:
+                        pushdomains = [domains[x] for x in domains if x not in assignments]
+                    else:
+                        pushdomains = None
+
+                    ################################################
+                    # Change heuristics for order of domain values #
+                    ################################################
+                    if stats is not None:
+                        start = perf_counter()
+                    values = value_heuristic(assignments, domains, domains[variable], self._value_heuristic_id,
+                                             counter)
+                    if stats is not None:
+                        stats.value_seconds += perf_counter() - start
+
+                    depths[variable] = len(stack)
+                    stack.append([variable, values, 0, pushdomains, (), False, set() if backjump else None])
+
+            if not stack:
+                return
+
+            frame = stack[-1]
+            variable, values, position, pushdomains, propagated, active, conflicts = frame
+
+            if active:
+                # Back from the subtree of the current value: retract it.
+                self.retractValue(variable, domains, assignments, pushdomains, propagated)
+                frame[5] = False
+
+            descend = False
+            while position < len(values):
+                value = values[position]
+                position += 1
+
+                if nogoods is not None and backjump:
+                    nogood = nogoods.violated(variable, value, assignments)
+                    if nogood is not None:
+                        # The value completes a nogood: its other variables explain the failure.
+                        conflicts.update(other for other, other_value in nogood if other != variable)
+                        if stats is not None:
+                            stats.nogood_prunes += 1
+                        continue
+
+                assignments[variable] = value
+                if counter is not None:
+                    counter.assign(value)
+                if pushdomains:
+                    for domain in pushdomains:
+                        domain.pushState()
+                propagated = ()
+                if stats is not None:
+                    if pushdomains:
+                        stats.pushes += len(pushdomains)
+                    start = perf_counter()
+                consistent = True
+                calls = 0
+                for calls, (constraint, variables) in enumerate(vconstraints[variable], 1):
+                    if not constraint(variables, domains, assignments, pushdomains):
+                        # Value is not good.
+                        consistent = False
+                        break
+                if stats is not None:
+                    stats.constraint_calls += calls
+                    stats.constraint_seconds += perf_counter() - start
+                if consistent and propagator is not None:
+                    # Propagate the assignment and what forward checking pruned to a fixpoint.
+                    if stats is not None:
+                        start = perf_counter()
+                    consistent, propagated = propagator.propagate(
+                        self._neighbours[variable] | {variable}, domains, assignments
+                    )
+                    if stats is not None:
+                        stats.propagation_seconds += perf_counter() - start
+                if consistent:
+                    # Value is good. Descend and get next variable.
+                    if pushdomains:
+                        self.refreshNeighbours(variable, domains, assignments, propagated)
+                    frame[2:6] = position, pushdomains, propagated, True
+                    descend = True
                     break
-            else:
-                # Value is good. Recurse and get next variable.
-                self.recursiveBacktracking(
-                    solutions, domains, vconstraints, assignments, single
-                )
-                if solutions and single:
-                    return solutions
+                if backjump:
+                    conflicts |= self.explainFailure(variable, value, vconstraints, domains, assignments)
+                self.retractValue(variable, domains, assignments, pushdomains, propagated)
+
+            if not descend:
+                # Every value failed: back to the previous variable.
+                if backjump:
+                    conflicts |= self.explainDomain(variable, assignments)
+                    conflicts.discard(variable)
+                    conflicts &= depths.keys()      # assignments made before the search are fixed
+
+                del assignments[variable]
+                if queue is not None:
+                    queue.add(variable, len(domains[variable]))
+                stack.pop()
+
+                if backjump:
+                    # ... or rather to the deepest variable of the conflict set.
+                    if not conflicts:
+                        # Nothing assigned can be undone to make a value of this variable work.
+                        self.unwind(stack, domains, assignments)
+                        return
+                    if nogoods is not None:
+                        nogoods.add(frozenset((other, assignments[other]) for other in conflicts))
+
+                    target = max(depths[other] for other in conflicts)
+                    if target < len(stack) - 1 and stats is not None:
+                        stats.backjumps += 1
+                    self.unwind(stack, domains, assignments, target + 1)
+
+                    conflicts.discard(stack[target][0])
+                    stack[target][6] |= conflicts
+
+    def unwind(self, stack, domains, assignments, keep=0):
+        """
+        Backtracks out of the frames of a search stack above the first keep frames (by default out of every frame,
+        restoring the domains and the heuristic bookkeeping to their state at the start of the search).
+        """
+        queue = self._queue
+        while len(stack) > keep:
+            variable, values, position, pushdomains, propagated, active, conflicts = stack.pop()
+            if active:
+                self.retractValue(variable, domains, assignments, pushdomains, propagated)
+            del assignments[variable]
+            if queue is not None:
+                queue.add(variable, len(domains[variable]))
+
+    def explainDomain(self, variable, assignments):
+        """
+        The assigned neighbours of a variable whose values forward checking may have pruned from its domain.
+        """
+        initial = self._initial[variable]
+        return set(x for x in self._neighbours[variable] if assignments.get(x) in initial)
+
+    def explainFailure(self, variable, value, vconstraints, domains, assignments):
+        """
+        The assigned variables that, together with the assignment of value to variable, made a constraint check
+        fail: the ones that pruned the domain that got wiped out, or the neighbour already holding the value.
+        """
+        for constraint, variables in vconstraints[variable]:
+            for x in variables:
+                if x not in assignments and not domains[x]:
+                    conflicts = self.explainDomain(x, assignments)
+                    conflicts.discard(variable)
+                    return conflicts
+        return set(x for x in self._neighbours[variable] if assignments.get(x) == value)
+
+    def retractValue(self, variable, domains, assignments, pushdomains, propagated):
+        """
+        Undoes the assignment of a value to variable: restores the pushed domains and the heuristic bookkeeping.
+        """
+        stats = self.stats
+        if stats is not None:
+            stats.backtracks += 1
             if pushdomains:
-                for domain in pushdomains:
-                    domain.popState()
-        del assignments[variable]
+                stats.pops += len(pushdomains)
+        if pushdomains:
+            for domain in pushdomains:
+                domain.popState()
+            self.refreshNeighbours(variable, domains, assignments, propagated)
+        if self._counter is not None:
+            self._counter.unassign(assignments[variable])
+
+    def recursiveBacktracking(
+        self, solutions, domains, vconstraints, assignments, single
+    ):
+        """
+        Collects solutions of the search from the given assignments (see backtrackingSearch) into a list, stopping
+        after the first one if single is set.
+        """
+        for solution in self.backtrackingSearch(domains, vconstraints, assignments):
+            solutions.append(solution.copy())
+            if single:
+                break
         return solutions
 
+    @property
+    def cutoff(self):
+        """
+        Whether the last search gave up after its node limit (instead of finding a solution or proving there is none).
+        """
+        return self._cutoff
+
     def getSolution(self, domains, constraints, vconstraints):
+        self._cutoff = False
+        if not self.startSearch(domains, vconstraints):
+            return None
+        if self._restarts is not None:
+            return self.restartingSearch(domains, vconstraints)
+        if self._node_limit is not None:
+            for solution in self.backtrackingSearch(domains, vconstraints, {}, self._node_limit):
+                return solution.copy()
+            return None
         solutions = self.recursiveBacktracking([], domains, vconstraints, {}, True)
         return solutions and solutions[0] or None
 
-    def getSolutions(self, domains, constraints, vconstraints):
-        return self.recursiveBacktracking([], domains, vconstraints, {}, False)
+    def restartingSearch(self, domains, vconstraints):
+        """
+        Searches for one solution in runs cut off after the node budgets of the restart schedule, reseeding the
+        random module before every restart. With a node limit, the last run only gets the nodes that are left.
+
+        @return: a dict of {variable: value, ...}, or None if a run exhausted the search space or the node limit
+                 was used up
+        """
+        budgets = restart_budgets(self._restarts, self._restart_base, self._restart_factor)
+        remaining = self._node_limit
+        for restart, budget in enumerate(budgets):
+            if remaining is not None:
+                if not remaining:
+                    return None
+                budget = min(budget, remaining)
+                remaining -= budget
+
+            if restart:
+                random.seed(self._seed + restart if self._seed is not None else None)
+                if self._queue is not None:
+                    # the keys of mrv+random hold random tie breakers drawn before the reseed
+                    self._queue = VariableQueue(domains, vconstraints, self._variable_heuristic_id)
+                if self.stats is not None:
+                    self.stats.restarts += 1
+
+            for solution in self.backtrackingSearch(domains, vconstraints, {}, budget):
+                return solution.copy()
+
+            if not self._cutoff:
+                return None
+
+    def getSolutions(self, domains, constraints, vconstraints, max_solutions=None):
+        return list(self.getSolutionIter(domains, constraints, vconstraints, max_solutions))
+
+    def getSolutionIter(self, domains, constraints, vconstraints, max_solutions=None):
+        """
+        Lazily enumerates the solutions of a problem (without restarts).
+
+        @param max_solutions: stop after this many solutions (default is all of them)
+        @return: a generator of dicts of {variable: value, ...}
+        """
+        if not self.startSearch(domains, vconstraints):
+            return
+        if max_solutions is not None and max_solutions <= 0:
+            return
+        found = 0
+        for solution in self.backtrackingSearch(domains, vconstraints, {}):
+            yield solution.copy()
+            found += 1
+            if found == max_solutions:
+                return
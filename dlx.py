@@ -0,0 +1,242 @@
+"""
+Dancing Links (Algorithm X) sudoku solver
+
+A sudoku is an exact cover problem: every (square, value) option covers four constraints (the square is filled, the
+row, the column and the subsquare contain the value), and a solution picks options covering every constraint
+exactly once. The constraints are the columns of a sparse 0/1 matrix stored as circular doubly linked lists in flat
+arrays, and Knuth's Algorithm X covers / uncovers them, always branching on the column with the fewest options.
+
+"""
+from classes import unit_tables
+
+
+class DancingLinksSolver:
+    """Exact cover sudoku solver for any board size, usable as an engine by helper_functions.solve_puzzles."""
+
+    def solve_board(self, board, candidates=None):
+        """
+        Solves a board.
+
+        :param board: the Board to be solved (left unchanged)
+        :param candidates: optional list of candidate bitmasks per square restricting the values tried
+        :return: a dict of {index: value, ...} for every square, or None if the board has no solution
+        """
+        for solution in self.solutions(board, candidates):
+            return solution
+        return None
+
+    def solutions(self, board, candidates=None, limit=None):
+        """
+        Lazily enumerates the solutions of a board.
+
+        :param board: the Board to be solved (left unchanged)
+        :param candidates: optional list of candidate bitmasks per square restricting the values tried
+        :param limit: stop after this many solutions (default: all of them)
+        :return: a generator of dicts of {index: value, ...} for every square
+        """
+        size = board.board_size
+        tables = unit_tables(size)
+        cells = [board.get_value(index) for index in range(size ** 2)]
+
+        # the givens satisfy their constraints up front, so only the remaining ones become columns
+        satisfied = set()
+        for index, value in enumerate(cells):
+            if value:
+                if not 1 <= value <= size:
+                    return      # a given is not a value of the board
+                keys = _constraints(tables, index, value)
+                if satisfied.intersection(keys):
+                    return      # a given repeats a value in a unit
+                satisfied.update(keys)
+
+        links = _Links()
+        column_of = {}
+        for index, value in enumerate(cells):
+            if value:
+                continue
+            for value in range(1, size + 1):
+                for key in _constraints(tables, index, value):
+                    if key not in satisfied and key not in column_of:
+                        column_of[key] = links.add_column()
+
+        options = []
+        for index, value in enumerate(cells):
+            if value:
+                continue
+            allowed = candidates[index] if candidates is not None else -1
+            for value in range(1, size + 1):
+                keys = _constraints(tables, index, value)
+                if (allowed >> (value - 1)) & 1 and not satisfied.intersection(keys):
+                    links.add_row([column_of[key] for key in keys], len(options))
+                    options.append((index, value))
+
+        found = 0
+        for chosen in links.search():
+            solution = dict(enumerate(cells))
+            for option in chosen:
+                index, value = options[option]
+                solution[index] = value
+            yield solution
+
+            found += 1
+            if limit is not None and found >= limit:
+                return
+
+
+def _constraints(tables, index, value):
+    """
+    The four exact cover constraints a square holding a value satisfies.
+    """
+    return (('square', index),
+            ('row', tables.row_of[index], value),
+            ('col', tables.col_of[index], value),
+            ('subsquare', tables.subsquare_of[index], value))
+
+
+class _Links:
+    """The sparse exact cover matrix. Node 0 is the root, column headers and option nodes follow."""
+
+    def __init__(self):
+        self.left = [0]
+        self.right = [0]
+        self.up = [0]
+        self.down = [0]
+        self.column = [0]
+        self.option = [-1]
+        self.size = [0]
+
+    def _node(self, column, option):
+        node = len(self.left)
+        self.left.append(node)
+        self.right.append(node)
+        self.up.append(node)
+        self.down.append(node)
+        self.column.append(column)
+        self.option.append(option)
+        self.size.append(0)
+        return node
+
+    def add_column(self):
+        """
+        Appends a column header to the header list.
+
+        :return: the node of the header
+        """
+        node = self._node(len(self.left), -1)
+        self.left[node] = self.left[0]
+        self.right[node] = 0
+        self.right[self.left[0]] = node
+        self.left[0] = node
+        return node
+
+    def add_row(self, columns, option):
+        """
+        Adds an option covering the given columns.
+
+        :param columns: the header nodes of the columns
+        :param option: the identifier yielded for the option when it is part of a solution
+        """
+        first = None
+        for column in columns:
+            node = self._node(column, option)
+
+            self.down[node] = column
+            self.up[node] = self.up[column]
+            self.down[self.up[column]] = node
+            self.up[column] = node
+            self.size[column] += 1
+
+            if first is None:
+                first = node
+            else:
+                self.right[node] = first
+                self.left[node] = self.left[first]
+                self.right[self.left[first]] = node
+                self.left[first] = node
+
+    def _cover(self, column):
+        left, right, up, down, col, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[column]] = right[column]
+        left[right[column]] = left[column]
+        i = down[column]
+        while i != column:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[col[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def _uncover(self, column):
+        left, right, up, down, col, size = self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[column]
+        while i != column:
+            j = left[i]
+            while j != i:
+                size[col[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[column]] = column
+        left[right[column]] = column
+
+    def _choose(self):
+        right, size = self.right, self.size
+        best = 0
+        best_size = None
+        column = right[0]
+        while column != 0:
+            if best_size is None or size[column] < best_size:
+                best, best_size = column, size[column]
+                if best_size <= 1:
+                    break
+            column = right[column]
+        return best
+
+    def search(self):
+        """
+        Algorithm X with an explicit stack, so deep boards don't hit the recursion limit.
+
+        :return: a generator of solutions, each a list of option identifiers
+        """
+        right, left, down, column = self.right, self.left, self.down, self.column
+        stack = []      # chosen option node per level
+
+        while True:
+            if right[0] == 0:
+                yield [self.option[node] for node in stack]
+                node = None
+            else:
+                header = self._choose()
+                if self.size[header] == 0:
+                    node = None
+                else:
+                    self._cover(header)
+                    node = down[header]
+
+            # advance to the next option (node), backtracking out of exhausted columns
+            while True:
+                if node is None:
+                    if not stack:
+                        return
+                    node = stack.pop()
+                    j = left[node]
+                    while j != node:
+                        self._uncover(column[j])
+                        j = left[j]
+                    node = down[node]
+
+                if node == column[node]:
+                    # every option of this column was tried
+                    self._uncover(node)
+                    node = None
+                    continue
+
+                j = right[node]
+                while j != node:
+                    self._cover(column[j])
+                    j = right[j]
+                stack.append(node)
+                break
@@ -1,9 +1,224 @@
-import csv
+import random
 
-from constraint import Problem, AllDifferentConstraint
-from classes import Board
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import chain, islice
+
+from constraint import AllDifferentConstraint, Domain
+from canonical import canonicalize
+from classes import CompactBoard, unit_tables
+from corpus import BinaryCorpus, CorpusWriter, is_corpus
+from native import bits_to_values
+from stats import SearchStats
+
+try:
+    from presolve import presolve as presolve_boards
+except ImportError:     # NumPy is not installed, puzzles can't be presolved
+    presolve_boards = None
 
 from datetime import datetime
+from time import perf_counter
+
+# outcome of solving one puzzle: its position in the input, the solved CompactBoard (None on failure), the runtime,
+# the SearchStats of the search (None unless the solver collects them, or if presolve alone settled the puzzle),
+# for a PortfolioSolver, the name of the configuration that answered first and, if solving the puzzle raised, the
+# error (the board is None then)
+SolveResult = namedtuple('SolveResult', ['index', 'board', 'seconds', 'stats', 'winner', 'error'],
+                         defaults=(None, None, None))
+
+_problem_templates = {}     # board size -> (constraints, vconstraints), filled in by problem_template
+
+
+def read_puzzles(input_file):
+    """
+    Lazily reads sudoku puzzles of any size (n = 2...6) from a file, detecting its format from the data:
+
+    - one puzzle per line as a string of symbols, e.g. the 81 character 3x3 format ('.' or '0' for empty squares,
+      letters after 9 for bigger boards, or A...Y for letter-coded 5x5 puzzles)
+    - one puzzle per line as n^4 comma separated values (the jumbo format)
+    - one puzzle per n^2 lines of n^2 comma separated values (the big puzzle format), possibly several per file
+    - a binary corpus (see corpus.py)
+
+    :param input_file: name of input file to be read
+    :return: a generator of 2D array boards
+    """
+    if is_corpus(input_file):
+        with BinaryCorpus(input_file) as corpus:
+            for puzzle in corpus:
+                yield puzzle
+        return
+
+    with open(input_file) as f:
+        lines = (line.strip() for line in f)
+        lines = (line for line in lines if line)        # skip blank lines
+
+        # look ahead a full 4x4 grid, to tell 2x2 puzzles from rows of 4x4 ones
+        head = list(islice(lines, 16))
+        if not head:
+            return
+        lines = chain(head, lines)
+
+        style = _text_format(head, input_file)
+
+        if style == 'symbols':
+            # the alphabet is decided once per file, so every puzzle of a letter-coded file is read the same way
+            symbols = _symbol_alphabet(head)
+            for line in lines:
+                yield _parse_symbols(line, symbols)
+            return
+
+        width = len(_parse_values(head[0]))
+
+        if style == 'flat':
+            size = _BOARD_AREAS[width]
+            for line in lines:
+                values = _parse_values(line, size)
+                if len(values) != width:
+                    raise ValueError('Expected {} values per puzzle, got {}'.format(width, len(values)))
+                yield _to_board(values, size)
+        else:
+            for rows in _chunks(lines, width):
+                if len(rows) != width:
+                    raise ValueError('Incomplete {0}x{0} puzzle at the end of {1}'.format(width, input_file))
+                board = [_parse_values(row, width) for row in rows]
+                if any(len(row) != width for row in board):
+                    raise ValueError('Expected {} values per row'.format(width))
+                yield board
+
+
+def _text_format(head, input_file):
+    """
+    Detects the text format of a puzzle file from its first (up to 16) non-blank lines.
+
+    :return: one of PUZZLE_FORMATS
+    """
+    if ',' not in head[0].rstrip(','):
+        return 'symbols'
+
+    width = len(_parse_values(head[0]))
+
+    # a single line of 16 values is either a 2x2 puzzle or a row of a 4x4 one
+    if width in _BOARD_AREAS and not (width == 16 and max(max(_parse_values(line)) for line in head) > 4):
+        return 'flat'
+    elif width in _BOARD_AREAS.values():
+        return 'grid'
+    raise ValueError('Unrecognized puzzle format in {}'.format(input_file))
+
+
+def puzzle_format(input_file):
+    """
+    Detects the format of a puzzle file the way read_puzzles does.
+
+    :param input_file: name of the file
+    :return: one of PUZZLE_FORMATS, 'corpus' for a binary corpus, or None for a file without puzzles
+    """
+    if is_corpus(input_file):
+        return 'corpus'
+
+    with open(input_file) as f:
+        head = list(islice((line.strip() for line in f if line.strip()), 16))
+    return _text_format(head, input_file) if head else None
+
+
+# symbols of the single line format, the value of a symbol is its position + 1 (too few for 36x36 boards, which
+# only fit the comma separated formats)
+SYMBOLS = '123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+LETTER_SYMBOLS = 'ABCDEFGHIJKLMNOPQRSTUVWXY'       # letter-coded 5x5 puzzles, A = 1
+EMPTY_SYMBOLS = '.0'
+
+PUZZLE_FORMATS = ('symbols', 'flat', 'grid')      # text formats written by format_puzzle
+
+# number of squares of a board -> side length of the board, for n = 2...6
+_BOARD_AREAS = {n ** 4: n ** 2 for n in range(2, 7)}
+
+
+def parse_puzzle(line):
+    """
+    Parses a puzzle stored on a single line, as a string of symbols (the 3x3 csv format) or as n^4 comma separated
+    values (the jumbo format).
+
+    :param line: the line
+    :return: a 2D array board
+    """
+    line = line.strip()
+    if ',' not in line.rstrip(','):
+        return _parse_symbols(line)
+
+    values = _parse_values(line)
+    if len(values) not in _BOARD_AREAS:
+        raise ValueError('Unrecognized puzzle of {} values'.format(len(values)))
+    size = _BOARD_AREAS[len(values)]
+    _check_values(values, size)
+    return _to_board(values, size)
+
+
+def _symbol_alphabet(lines):
+    """
+    Chooses the symbols of puzzles stored as strings of symbols: A...Y if they are 5x5 puzzles without any digit
+    1...9, the digits followed by letters otherwise.
+    """
+    lines = [line.rstrip(',') for line in lines]
+    if all(len(line) == 625 and not any(digit in line for digit in SYMBOLS[:9]) for line in lines):
+        return LETTER_SYMBOLS
+    return SYMBOLS
+
+
+def _parse_symbols(line, symbols=None):
+    """
+    Parses a puzzle stored as a string of symbols (a trailing comma is ignored).
+
+    :param symbols: the alphabet of the file the line belongs to (default: chosen from the line, see _symbol_alphabet)
+    """
+    line = line.rstrip(',')
+
+    if len(line) not in _BOARD_AREAS:
+        raise ValueError('Unrecognized puzzle of length {}: {}'.format(len(line), line))
+    size = _BOARD_AREAS[len(line)]
+    if size > len(SYMBOLS):
+        raise ValueError('{0}x{0} puzzles have no single line symbol format, use comma separated values'.format(size))
+
+    if symbols is None:
+        symbols = _symbol_alphabet([line])
+
+    values = []
+    for symbol in line.upper():
+        if symbol in EMPTY_SYMBOLS:
+            values.append(0)
+        else:
+            value = symbols.find(symbol) + 1
+            if not 0 < value <= size:
+                raise ValueError('Invalid symbol {!r} for a {}x{} puzzle'.format(symbol, size, size))
+            values.append(value)
+
+    return _to_board(values, size)
+
+
+def _parse_values(line, size=None):
+    """
+    Parses a line of comma separated values ('' or '.' for empty squares, a trailing comma is ignored).
+
+    :param size: the side length of the board, if known, every value must be in 0...size
+    """
+    values = [int(entry) if entry.strip() not in ('', '.') else 0 for entry in line.rstrip(',').split(',')]
+    if size is not None:
+        _check_values(values, size)
+    return values
+
+
+def _check_values(values, size):
+    """
+    Raises a ValueError if a value doesn't fit a board of the given size.
+    """
+    for value in values:
+        if not 0 <= value <= size:
+            raise ValueError('Invalid value {} for a {}x{} puzzle'.format(value, size, size))
+
+
+def _to_board(values, size):
+    """
+    Converts a flat list of values into a 2D array board.
+    """
+    return [values[row * size:(row + 1) * size] for row in range(size)]
 
 
 def read_standard_puzzles(input_file):
@@ -13,15 +228,7 @@ def read_standard_puzzles(input_file):
     :param input_file: name of input file to be read
     :return: an array of 2D array boards
     """
-    puzzles = []
-    with open(input_file) as f:
-        for line in f:
-            to_add = [[None for i in range(9)] for j in range(9)]
-            for i in range(len(line)-2):
-                to_add[i // 9][i % 9] = int(line[i]) if line[i] != '.' else 0
-            puzzles.append(to_add)
-
-    return puzzles
+    return list(read_puzzles(input_file))
 
 
 def read_jumbo_puzzles(input_file):
@@ -31,18 +238,7 @@ def read_jumbo_puzzles(input_file):
     :param input_file: name of input file to be read
     :return: an array of 2D array boards
     """
-    read_puzzles = []
-    with open(input_file, 'r') as f:
-        reader = csv.reader(f, delimiter=',')
-        for row in reader:
-            to_add = []
-            for i in range(16):
-                add_row = []
-                for j in range(16):
-                    add_row.append(int(row[16*i+j]))
-                to_add.append(add_row)
-            read_puzzles.append(to_add)
-    return read_puzzles
+    return list(read_puzzles(input_file))
 
 
 def read_big_puzzle(input_file):
@@ -50,60 +246,501 @@ def read_big_puzzle(input_file):
     Reads one 4x4 sudoku puzzle in csv format.
 
     :param input_file: name of input file to be read
-    :return: an array of 2D array boards
+    :return: a 2D array board
 
     NOTE: did not make it into the final version of the project :(
     """
-    puzzle = []
-    infile = csv.reader(open(input_file), delimiter=',')
+    return next(read_puzzles(input_file))
+
+
+def format_puzzle(puzzle, style='symbols'):
+    """
+    Formats a puzzle as lines of one of the text formats read_puzzles detects.
 
-    for row in infile:
-        puzzle.append([int(entry) for entry in row])
+    :param puzzle: a 2D array board
+    :param style: one of PUZZLE_FORMATS; symbols is the 3x3 csv format (one line of symbols, '.' for empty squares,
+                  up to 25x25 boards), flat the jumbo format (one line of n^4 comma separated values), grid the big
+                  puzzle format (n^2 lines of n^2 comma separated values)
+    :return: a list of lines, without line endings
+    """
+    if style == 'symbols':
+        if len(puzzle) > len(SYMBOLS):
+            raise ValueError('{0}x{0} puzzles have no single line symbol format, use the flat or grid format'
+                             .format(len(puzzle)))
+        return [''.join(SYMBOLS[value - 1] if value else '.' for row in puzzle for value in row) + ',']
+    elif style == 'flat':
+        return [','.join(str(value) for row in puzzle for value in row)]
+    elif style == 'grid':
+        return [','.join(str(value) for value in row) for row in puzzle]
+    raise ValueError('Unknown puzzle format {!r}, choose from {}'.format(style, PUZZLE_FORMATS))
 
-    return puzzle
 
+def open_puzzles(input_file):
+    """
+    Opens a puzzle file for solving: binary corpora are memory-mapped (so workers can take slices of them), other
+    formats are read lazily by read_puzzles.
 
-def solve_puzzles(puzzles, solver):
+    :param input_file: name of input file to be read
+    :return: a BinaryCorpus or a generator of 2D array boards
     """
-    Solves an array of sudoku puzzles, recording runtime.
+    if is_corpus(input_file):
+        return BinaryCorpus(input_file)
+    return read_puzzles(input_file)
+
+
+def convert_puzzles(input_file, output_file, solutions=None):
+    """
+    Converts a puzzle file in any format read_puzzles detects into a binary corpus.
+
+    :param input_file: name of input file to be read
+    :param output_file: name of the corpus file to be written
+    :param solutions: optional iterable of solved 2D array boards, in the same order as the puzzles
+    :return: the number of puzzles written
+    """
+    puzzles = read_puzzles(input_file)
+    first = next(puzzles, None)
+    if first is None:
+        raise ValueError('No puzzles in {}'.format(input_file))
+
+    solutions = iter(solutions) if solutions is not None else None
+
+    with CorpusWriter(output_file, len(first), solutions=solutions is not None) as writer:
+        for puzzle in chain([first], puzzles):
+            writer.write(puzzle, next(solutions) if solutions is not None else None)
+
+    return writer.count
+
+
+def problem_template(board_size):
+    """
+    Return the compiled sudoku CSP of a board size, computing it on first use.
+
+    The constraint graph is the same for every puzzle of a size, so the constraints and the vconstraints mapping
+    that Problem would build for its solver are shared, and a puzzle only has to supply its domains.
+
+    :param board_size: the side length of the board (n^2)
+    :return: a tuple (list of (constraint, variables), dict of {variable: [(constraint, variables), ...], ...})
+    """
+    template = _problem_templates.get(board_size)
+
+    if template is None:
+        # add uniqueness constraints to each row, column, and subsquare, in the order Problem was given them (the
+        # i-th row, column and subsquare together), which decides the order constraints are checked and propagated in
+        tables = unit_tables(board_size)
+        constraints = [(AllDifferentConstraint(), list(unit))
+                       for i in range(board_size)
+                       for unit in (tables.rows[i], tables.cols[i], tables.subsquares[i])]
+
+        vconstraints = {index: [] for index in range(board_size ** 2)}
+        for constraint, variables in constraints:
+            for variable in variables:
+                vconstraints[variable].append((constraint, variables))
+
+        template = constraints, vconstraints
+        _problem_templates[board_size] = template
+
+    return template
+
+
+def puzzle_domains(board, candidates=None):
+    """
+    Return the CSP domains of a board: its value for the given squares, 1...size (or their candidates) for the others.
+
+    :param board: the Board (or CompactBoard) to be solved
+    :param candidates: optional list of candidate bitmasks per square (e.g. from presolve)
+    :return: a dict of {index: Domain, ...} for every square, indexed 0...size^2-1
+    """
+    domains = {}
+    full = range(1, board.board_size + 1)
+
+    for index in range(board.board_size ** 2):
+        value = board.get_value(index)
+        if value != 0:
+            domains[index] = Domain([value])
+        elif candidates is not None:
+            domains[index] = Domain(bits_to_values(int(candidates[index])))
+        else:
+            domains[index] = Domain(full)
+
+    return domains
+
+
+def solve_board(board, solver, candidates=None):
+    """
+    Solves one sudoku board in place.
+
+    :param board: the Board (or CompactBoard) to be solved
+    :param solver: the CSP solver to be used, or an engine providing its own solve_board method
+    :param candidates: optional list of candidate bitmasks per square restricting the search (e.g. from presolve)
+    :return: whether a solution was found
+    """
+    if hasattr(solver, 'solve_board'):
+        sln = solver.solve_board(board, candidates)     # engine with its own board representation
+    else:
+        constraints, vconstraints = problem_template(board.board_size)
+        sln = solver.getSolution(puzzle_domains(board, candidates), constraints, vconstraints)      # solve CSP
+
+    if not sln:
+        return False
+
+    # assign solved values
+    for index, value in sln.items():
+        board.set_value(index, value)
 
-    :param puzzles: an array of 2D array boards
+    return True
+
+
+def solve_chunk(chunk, solver, presolve=False):
+    """
+    Solves a chunk of puzzles one after another, timing each of them.
+
+    With presolve, naked and hidden singles are first filled in for all puzzles of a size in the chunk at once (see
+    presolve.py), the solver only searches the puzzles that are left unsolved, and the presolve time is split evenly
+    over the puzzles presolved together.
+
+    :param chunk: a list of (index, 2D array board) pairs (or flat bytes-like boards, e.g. views into a corpus)
     :param solver: the CSP solver to be used
-    :return: none
+    :param presolve: whether to run the batched propagation pre-pass (requires NumPy)
+    :return: a list of SolveResults, in the order of the chunk (a puzzle that makes the solver raise gets a failed
+             result carrying the error, the others are solved as usual)
+    """
+    chunk = list(chunk)
+
+    if presolve and chunk:
+        if presolve_boards is None:
+            raise RuntimeError('presolving puzzles requires NumPy')
+
+        # boards of different sizes can't be stacked into one array, presolve every size on its own
+        groups = {}
+        for position, (index, puzzle) in enumerate(chunk):
+            groups.setdefault(len(puzzle), []).append(position)
+
+        results = [None] * len(chunk)
+        for positions in groups.values():
+            start_time = perf_counter()
+            try:
+                presolved = presolve_boards([chunk[position][1] for position in positions])
+            except Exception:
+                # a malformed puzzle spoils the batch, search every puzzle on its own to find out which one it is
+                for position in positions:
+                    results[position] = _solve_one(*chunk[position], solver)
+                continue
+            share = (perf_counter() - start_time) / len(positions)
+
+            for i, position in enumerate(positions):
+                index = chunk[position][0]
+                if presolved.solved[i] or presolved.contradiction[i]:
+                    b = CompactBoard(presolved.boards[i].tolist())
+                    results[position] = SolveResult(index, b if presolved.solved[i] else None, share)
+                else:
+                    results[position] = _solve_one(index, presolved.boards[i].tolist(), solver,
+                                                   presolved.candidates[i].tolist(), share)
+
+        return results
+
+    return [_solve_one(index, puzzle, solver) for index, puzzle in chunk]
+
+
+def _solve_one(index, puzzle, solver, candidates=None, seconds=0.0):
+    """
+    Solves a puzzle of a chunk, timing it. An exception only fails this puzzle: its result carries the error.
+
+    :param seconds: time already spent on the puzzle (e.g. its share of the presolve)
+    :return: the SolveResult of the puzzle
+    """
+    start_time = perf_counter()
+    try:
+        b = CompactBoard(puzzle)
+        solved = solve_board(b, solver, candidates)
+    except Exception as e:
+        return SolveResult(index, None, seconds + perf_counter() - start_time,
+                           error='{}: {}'.format(type(e).__name__, e))
+
+    return SolveResult(index, b if solved else None, seconds + perf_counter() - start_time,
+                       getattr(solver, 'stats', None), getattr(solver, 'winner', None))
+
+
+def _chunks(iterable, size):
+    """
+    Splits an iterable into lists of (at most) size items.
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+# solver (and corpus, when solving a BinaryCorpus) used by the worker processes of iter_solutions, set up once
+# per worker
+_worker_solver = None
+_worker_corpus = None
+_worker_presolve = False
+
+
+def _init_worker(solver, corpus=None, presolve=False):
+    """
+    Initializes a worker process with the solver configuration of the batch.
+
+    :param solver: the CSP solver to be used
+    :param corpus: the BinaryCorpus being solved, if any (the worker maps the file itself)
+    :param presolve: whether chunks are presolved before searching
+    """
+    global _worker_solver, _worker_corpus, _worker_presolve
+    _worker_solver = solver
+    _worker_corpus = corpus
+    _worker_presolve = presolve
+
+    # forked workers inherit the parent's random state, reseed so randomized heuristics differ across workers
+    random.seed()
+
+
+def _solve_worker_chunk(chunk):
+    return solve_chunk(chunk, _worker_solver, _worker_presolve)
+
+
+def _solve_worker_range(start, stop):
+    views = (_worker_corpus.puzzle_view(index) for index in range(start, stop))
+    return solve_chunk(zip(range(start, stop), views), _worker_solver, _worker_presolve)
+
+
+def iter_solutions(puzzles, solver, workers=1, chunksize=16, presolve=False, ordered=True, skip=None):
+    """
+    Solves puzzles, yielding a SolveResult per puzzle in the original order (or, unordered, as chunks complete).
+
+    With more than one worker, the puzzles are dispatched in chunks to a pool of processes. Only a couple of
+    chunks per worker are in flight at any time, so puzzles are read from the iterable as they are needed. The
+    puzzles of a BinaryCorpus are not sent at all: workers read their chunk from the memory-mapped file. Unordered,
+    a slow chunk doesn't hold back the results of the chunks dispatched after it.
+
+    :param puzzles: an iterable of 2D array boards, or a BinaryCorpus
+    :param solver: the CSP solver to be used (copied to every worker)
+    :param workers: number of processes solving puzzles
+    :param chunksize: number of puzzles sent to a worker at once (and presolved together)
+    :param presolve: whether to fill in naked and hidden singles of every chunk before searching (requires NumPy)
+    :param ordered: whether results are yielded in the order of the puzzles
+    :param skip: optional checkpoint.Checkpoint, the puzzles it has finished are not solved (results keep the
+                 positions of their puzzles in the input)
+    :return: a generator of SolveResults
+    """
+    chunks = _chunks(((index, puzzle) for index, puzzle in enumerate(puzzles)
+                      if skip is None or not skip.done(index)), chunksize)
+
+    if workers <= 1:
+        for chunk in chunks:
+            for result in solve_chunk(chunk, solver, presolve):
+                yield result
+        return
+
+    corpus = puzzles if isinstance(puzzles, BinaryCorpus) else None
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(solver, corpus, presolve)) as executor:
+        pending = deque()
+
+        if corpus is not None:
+            spans = skip.missing(len(corpus)) if skip is not None else [(0, len(corpus))]
+            tasks = ((_solve_worker_range, start, min(start + chunksize, stop))
+                     for first, stop in spans for start in range(first, stop, chunksize))
+        else:
+            tasks = ((_solve_worker_chunk, chunk) for chunk in chunks)
+
+        for task in tasks:
+            pending.append(executor.submit(*task))
+
+            # wait for the oldest (or, unordered, the first finished) chunk before dispatching more than 2 chunks
+            # per worker
+            if len(pending) >= 2 * workers:
+                for result in _next_chunk(pending, ordered):
+                    yield result
+
+        while pending:
+            for result in _next_chunk(pending, ordered):
+                yield result
+
+
+def _next_chunk(pending, ordered):
+    """
+    Removes the oldest future from a deque of pending chunks, or the first one to finish if not ordered.
+
+    :return: the results of its chunk
+    """
+    if ordered:
+        return pending.popleft().result()
+
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    future = next(future for future in pending if future in done)
+    pending.remove(future)
+    return future.result()
+
+
+def in_order(results, skip=None):
+    """
+    Puts SolveResults back into the order of their puzzles, holding back the ones that arrive early.
+
+    :param results: an iterable of SolveResults, e.g. from iter_cached_solutions, indexed 0, 1, 2, ... in any order
+    :param skip: optional checkpoint.Checkpoint of the puzzles that have no result (only finished puzzles that were
+                 yielded are added to it later, so it may be updated while this runs)
+    :return: a generator of the SolveResults ordered by index
+    """
+    early = {}
+    expected = 0
+
+    for result in results:
+        early[result.index] = result
+        while True:
+            if expected in early:
+                yield early.pop(expected)
+            elif skip is None or not skip.done(expected):
+                break
+            expected += 1
+
+
+def iter_cached_solutions(puzzles, solver, cache, workers=1, chunksize=16, presolve=False, skip=None):
+    """
+    Solves puzzles like iter_solutions, looking every puzzle up in a solution cache first and storing the solutions
+    found. Cached puzzles are yielded as soon as they are looked up, so results are not in input order. A puzzle
+    equivalent to one that is still being solved isn't solved again, it gets its solution from the cache as soon as
+    that one is done.
+
+    :param puzzles: an iterable of 2D array boards
+    :param solver: the CSP solver to be used
+    :param cache: a canonical.SolutionCache
+    :param workers: number of processes solving the puzzles that are not cached
+    :param chunksize: number of puzzles sent to a worker at once (and presolved together)
+    :param presolve: whether to fill in naked and hidden singles of every chunk before searching (requires NumPy)
+    :param skip: optional checkpoint.Checkpoint, the puzzles it has finished are neither looked up nor solved
+    :return: a generator of SolveResults; the runtime of every puzzle includes its lookup
+    """
+    hits = deque()
+    misses = []     # (index, canonical form, lookup time) of every puzzle passed on to the solver
+    repeats = {}    # key of every form in flight -> (index, canonical form, lookup time) of its repeats looked up since
+
+    def lookup():
+        for index, puzzle in enumerate(puzzles):
+            if skip is not None and skip.done(index):
+                continue
+            start_time = perf_counter()
+            form = canonicalize(puzzle)
+            if form.key in repeats:
+                # an equivalent puzzle is being solved, its solution will serve this one too
+                repeats[form.key].append((index, form, perf_counter() - start_time))
+                continue
+            solution = cache.get(form)
+            if solution is not None:
+                hits.append(SolveResult(index, CompactBoard(solution), perf_counter() - start_time))
+            else:
+                misses.append((index, form, perf_counter() - start_time))
+                repeats[form.key] = []
+                yield puzzle
+
+    for result in iter_solutions(lookup(), solver, workers, chunksize, presolve):
+        while hits:
+            yield hits.popleft()
+
+        index, form, seconds = misses[result.index]
+        if result.board is not None:
+            cache.put(form, result.board.board)
+        yield result._replace(index=index, seconds=result.seconds + seconds)
+
+        for index, form, seconds in repeats.pop(form.key):
+            start_time = perf_counter()
+            if result.board is not None:
+                solution = CompactBoard(cache.get(form))
+            else:
+                # unsolvable, like the puzzle it repeats
+                solution = None
+                cache.misses += 1
+            yield SolveResult(index, solution, seconds + perf_counter() - start_time)
+
+    while hits:
+        yield hits.popleft()
+
+
+def _remember(puzzles, waiting, skip=None):
+    """
+    Passes puzzles on, keeping every one (except those a checkpoint has finished) in a dict by its position until it
+    is removed.
+    """
+    for index, puzzle in enumerate(puzzles):
+        if skip is None or not skip.done(index):
+            waiting[index] = puzzle
+        yield puzzle
+
+
+def solve_puzzles(puzzles, solver, workers=1, chunksize=16, presolve=False, cache=None, sink=None, ordered=True,
+                  checkpoint=None):
+    """
+    Solves an array of sudoku puzzles, recording runtime.
+
+    :param puzzles: an iterable of 2D array boards, e.g. the generator returned by read_puzzles
+    :param solver: the CSP solver to be used, or an engine providing its own solve_board method
+    :param workers: number of processes solving puzzles in parallel
+    :param chunksize: number of puzzles sent to a worker at once (and presolved together)
+    :param presolve: whether to fill in naked and hidden singles of every chunk before searching (requires NumPy)
+    :param cache: optional canonical.SolutionCache consulted before solving a puzzle (see iter_cached_solutions)
+    :param sink: optional result sink (see sinks.py) every result is written to as soon as it is available
+    :param ordered: whether results reach the sink in the order of the puzzles, otherwise as they complete
+    :param checkpoint: optional checkpoint.Checkpoint, the puzzles it has finished are skipped and every result
+                       written is recorded in it
+    :return: a tuple (list of per-puzzle runtimes in seconds, number of failed puzzles, SearchStats merged over
+             all puzzles or None if the solver collects none)
     """
     fail_count = 0
+    timings = []
+    stats = None
+    wins = {}
     start_time = datetime.now()     # start timer (for runtime)
 
-    for puzzle in puzzles:
-        # initialize Board
-        b = Board(puzzle)
+    # the sink gets every puzzle along with its result: a corpus has them at hand, other puzzles are kept until
+    # their result comes back
+    waiting = {}
+    if sink is not None and isinstance(puzzles, BinaryCorpus):
+        puzzle_of = puzzles.puzzle
+    elif sink is not None:
+        puzzle_of = waiting.pop
+        puzzles = _remember(puzzles, waiting, checkpoint)
 
-        sudoku = Problem(solver)      # initialize CSP with custom solver
+    if checkpoint is not None and len(checkpoint):
+        print("Skipped: {} puzzles finished before".format(len(checkpoint)))
 
-        # add variables for each square, indexed 1...size^2
-        for index in range(b.board_size ** 2):
-            value = b.get_value(index)
+    if cache is not None:
+        results = iter_cached_solutions(puzzles, solver, cache, workers, chunksize, presolve, checkpoint)
+        if ordered:
+            results = in_order(results, checkpoint)
+    else:
+        results = iter_solutions(puzzles, solver, workers, chunksize, presolve, ordered, checkpoint)
 
-            if value == 0:
-                sudoku.addVariable(index, range(1, b.board_size + 1))
-            else:
-                sudoku.addVariable(index, [value])
+    try:
+        for result in results:
+            if sink is not None:
+                sink.write(result, puzzle_of(result.index))
+            if checkpoint is not None:
+                checkpoint.record(result.index, sink)
 
-        # add uniqueness constraints to each row, column, and subsquare
-        for i in range(b.board_size):
-            sudoku.addConstraint(AllDifferentConstraint(), [el[0] for el in b.row(i)])
-            sudoku.addConstraint(AllDifferentConstraint(), [el[0] for el in b.col(i)])
-            sudoku.addConstraint(AllDifferentConstraint(), [el[0] for el in b.subsquare(i)])
+            timings.append(result.seconds)
 
-        sln = sudoku.getSolution()      # solve CSP
+            if result.board is None:
+                fail_count += 1
 
-        if sln:
-            # assign solved values
-            for index, value in sln.items():
-                b.set_value(index, value)
-        else:
-            fail_count += 1
+            if result.stats is not None:
+                stats = (stats or SearchStats()).merge(result.stats)
+
+            if result.winner is not None:
+                wins[result.winner] = wins.get(result.winner, 0) + 1
+    finally:
+        if checkpoint is not None:
+            checkpoint.save(sink)
 
     # perform/display runtime calculation
     runtime = datetime.now() - start_time
     print("Runtime: {} seconds ({} failed)".format(runtime.total_seconds(), fail_count))
+    if stats is not None:
+        print("Search: {}".format(stats))
+    if cache is not None:
+        print("Cache: {} hits, {} misses".format(cache.hits, cache.misses))
+    if wins:
+        print("Wins: {}".format(', '.join('{} {}'.format(name, count) for name, count in sorted(wins.items()))))
+
+    return timings, fail_count, stats
@@ -2,8 +2,22 @@
 Apply heuristics for recursive backtracking solver
 
 """
+import heapq
 import random
-import math
+
+# identifiers accepted by variable_heuristic / value_heuristic ('none' or any unknown id means no heuristic)
+VARIABLE_HEURISTICS = ('degree', 'mrv', 'random', 'deg+mrv', 'mrv+random', 'none')
+VALUE_HEURISTICS = ('random', 'lcv', 'least_used', 'none')
+
+# variable heuristics that are served incrementally by a VariableQueue instead of re-sorting every node
+QUEUED_HEURISTICS = ('mrv', 'deg+mrv', 'mrv+random')
+
+# value heuristics that read their counts from a ValueCounter instead of rescanning every node
+COUNTED_HEURISTICS = ('lcv', 'least_used')
+
+# heuristics breaking ties randomly; without one of them every restart of a search repeats the same choices
+RANDOMIZED_VARIABLE_HEURISTICS = ('random', 'mrv+random')
+RANDOMIZED_VALUE_HEURISTICS = ('random',)
 
 
 def variable_heuristic(domains, vconstraints, heuristic):
@@ -30,7 +44,7 @@ def variable_heuristic(domains, vconstraints, heuristic):
         return no_var_heur(domains)
 
 
-def value_heuristic(assignments, domains, domain, heuristic):
+def value_heuristic(assignments, domains, domain, heuristic, counter=None):
     """
     Applies the given heuristic checking values in the domain
 
@@ -38,14 +52,15 @@ def value_heuristic(assignments, domains, domain, heuristic):
     :param domains: the dict of {variable: [domain values], ...}
     :param domain:  an array of the remaining values in the domain for the current variable
     :param heuristic: a string of which heuristic you want to use
+    :param counter: an up to date ValueCounter, if the solver maintains one (otherwise the counts are recomputed)
     :return: an array of remaining values in the domain in a certain order based upon heuristics
     """
     if heuristic == 'random':
         return random_value(domain)
     elif heuristic == 'lcv':
-        return lcv(domains, domain)
+        return lcv(domains, domain, counter.in_domains if counter else None)
     elif heuristic == 'least_used':
-        return least_used(assignments, domains, domain)
+        return least_used(assignments, domains, domain, counter.assigned if counter else None)
     # No heuristic
     else:
         return domain
@@ -166,9 +181,156 @@ def mrv_and_random(domains):
     return lst
 
 
+class VariableQueue:
+    """
+    Priority queue of the unassigned variables for the MRV family of heuristics. Instead of sorting every variable
+    at every node, the solver reports the variables whose domain size may have changed (the neighbours of an
+    assignment, after forward checking or after restoring domains) and the queue re-keys just those, so picking
+    the next variable costs O(log V).
+
+    Outdated heap entries are skipped lazily when they reach the top.
+    """
+
+    def __init__(self, domains, vconstraints, heuristic):
+        """
+        :param domains: the dict of {variable: [domain values], ...}
+        :param vconstraints: dict of {variable: [(constraintObject, [vars in constraint]), ...], ...}
+        :param heuristic: one of QUEUED_HEURISTICS
+        """
+        self._heuristic = heuristic
+        self._degree = {variable: -len(vconstraints[variable]) for variable in domains}
+        self._sizes = {}
+        self._keys = {}
+        self._heap = []
+
+        for variable in domains:
+            self.add(variable, len(domains[variable]))
+
+    def _key(self, variable, size):
+        if self._heuristic == 'deg+mrv':
+            return self._degree[variable], size, variable
+        elif self._heuristic == 'mrv+random':
+            # ties among the smallest domains (other than singletons) are broken randomly, see mrv_and_random
+            return size, (0 if size == 1 else random.random()), variable
+        return size, variable
+
+    def add(self, variable, size):
+        """
+        Puts a variable (back) into the queue, e.g. when its assignment is undone
+
+        :param variable: the variable
+        :param size: the current size of its domain
+        """
+        key = self._key(variable, size)
+        self._sizes[variable] = size
+        self._keys[variable] = key
+        heapq.heappush(self._heap, key)
+
+        # drop outdated entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._keys) + 64:
+            self._heap = list(self._keys.values())
+            heapq.heapify(self._heap)
+
+    def remove(self, variable):
+        """
+        Takes a variable out of the queue, e.g. when it gets assigned
+
+        :param variable: the variable
+        """
+        del self._keys[variable]
+        del self._sizes[variable]
+
+    def update(self, variable, size):
+        """
+        Re-keys a queued variable if its domain size changed; variables not in the queue are ignored
+
+        :param variable: the variable
+        :param size: the current size of its domain
+        """
+        if self._sizes.get(variable, size) != size:
+            self.add(variable, size)
+
+    def peek(self):
+        """
+        :return: the next variable to assign, or None if every variable is assigned
+        """
+        heap = self._heap
+        keys = self._keys
+        while heap:
+            key = heap[0]
+            if keys.get(key[-1]) == key:
+                return key[-1]
+            heapq.heappop(heap)
+        return None
+
+
 # END SELECT-UNASSIGNED-VARIABLE HEURISTICS
 
 # BEGIN SELECT-VALUE-FROM-DOMAIN HEURISTICS
+class ValueCounter:
+    """
+    Value frequencies for the lcv and least_used heuristics, kept up to date by the solver instead of being
+    recounted over every domain / assignment at every node.
+
+    in_domains[value] is the number of domains containing value, and assigned[value] the number of variables
+    currently assigned value.
+    """
+
+    def __init__(self, domains, track_domains=True):
+        """
+        :param domains: the dict of {variable: [domain values], ...}
+        :param track_domains: whether in_domains is kept up to date (only lcv needs it)
+        """
+        self.in_domains = {}
+        self.assigned = {}
+        self._counted = {} if track_domains else None
+
+        for variable, domain in domains.items():
+            for value in domain:
+                self.in_domains[value] = self.in_domains.get(value, 0) + 1
+                self.assigned.setdefault(value, 0)
+            if track_domains:
+                self._counted[variable] = list(domain)
+
+    def refresh(self, variables, domains):
+        """
+        Updates the counts after the domains of variables were pruned or restored. The solver refreshes a domain
+        after every change, so a domain with the same length as last time still holds the same values.
+
+        :param variables: the variables whose domains may have changed
+        :param domains: the dict of {variable: [domain values], ...}
+        """
+        counted = self._counted
+        if counted is None:
+            return
+
+        in_domains = self.in_domains
+        for variable in variables:
+            domain = domains[variable]
+            if len(counted[variable]) != len(domain):
+                for value in counted[variable]:
+                    in_domains[value] -= 1
+                for value in domain:
+                    in_domains[value] += 1
+                counted[variable] = list(domain)
+
+    def assign(self, value):
+        """
+        Records that a variable was assigned value
+
+        :param value: the value
+        """
+        self.assigned[value] += 1
+
+    def unassign(self, value):
+        """
+        Records that an assignment of value was undone
+
+        :param value: the value
+        """
+        self.assigned[value] -= 1
+
+
 def random_value(domain):
     """
     Randomizes the order of domain values to check
@@ -181,49 +343,49 @@ def random_value(domain):
     return newlst
 
 
-def lcv(domains, domain):
+def lcv(domains, domain, count=None):
     """
     Sort by the values that affect the least amount of constraints (i.e. sort by number of times each
     value appears in domains)
 
     :param domains: the dict of {variable: [domain values], ...}
     :param domain: an array of remaining domain values
+    :param count: dict of {value: # of domains containing it}, computed from domains if not given
     :return: an array sorted by the values that constrain the least amount of other variables
     """
-    # Initialize array for count of each value
-    count = [0 for i in range(int(math.sqrt(len(domains))))]
-
-    # Iterate through domains, counting each time the values are used
-    for dom in domains.items():
-        for val in dom[1]:
-            count[val-1] += 1
+    if count is None:
+        # Iterate through domains, counting each time the values are used
+        count = {}
+        for dom in domains.items():
+            for val in dom[1]:
+                count[val] = count.get(val, 0) + 1
 
     # Now sort by the count of each value
-    domain_count = [(count[val-1], val) for val in domain]
+    domain_count = [(count[val], val) for val in domain]
     domain_count.sort()
     new_domain = [val[1] for val in domain_count]
     return new_domain
 
 
-def least_used(assignments, domains, domain):
+def least_used(assignments, domains, domain, count=None):
     """
     Sort the domain of the current value based upon how many times each value has been used already
 
     :param assignments: a dict of {variable: value, ...}
     :param domains: the dict of {variable: [domain values], ...}
     :param domain: an array of remaining domain values
+    :param count: dict of {value: # of assignments using it}, computed from assignments if not given
     :return: a sorted array in ascending order of # of times each value was used
     """
-    # Initialize array for count of each value
-    count = [0 for i in range(int(math.sqrt(len(domains))))]
-
-    # Iterate through assignments, counting each time the values are used
-    for assignment in assignments.items():
-        if assignment[1] is not None:
-            count[assignment[1]-1] += 1
+    if count is None:
+        # Iterate through assignments, counting each time the values are used
+        count = {}
+        for assignment in assignments.items():
+            if assignment[1] is not None:
+                count[assignment[1]] = count.get(assignment[1], 0) + 1
 
     # Now copy the # of times values are used into just the values left in the domain of current variable
-    domain_count = [(count[val-1], val) for val in domain]
+    domain_count = [(count.get(val, 0), val) for val in domain]
     domain_count.sort()
     new_domain = [val[1] for val in domain_count]
     return new_domain
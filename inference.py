@@ -0,0 +1,181 @@
+"""
+Constraint propagation for the recursive backtracking solver
+
+After every assignment (and its forward checking), the solver can run stronger inference over the all-different
+constraints until nothing changes anymore. Values are only ever hidden from the domains of unassigned variables,
+which the solver has pushed the state of, so backtracking restores them with popState as usual.
+
+Levels, each including the previous ones:
+    fc      - forward checking only, i.e. no extra propagation
+    ac3     - arc consistency on the pairwise differences: a single remaining value is removed from every neighbour
+    singles - hidden singles: a value that fits in only one variable of a unit is assigned to that variable
+    pairs   - naked pairs / triples: k variables of a unit sharing k values remove them from the rest of the unit
+
+"""
+from itertools import combinations
+
+from constraint import AllDifferentConstraint
+
+PROPAGATION_LEVELS = ('fc', 'ac3', 'singles', 'pairs')
+
+
+class Propagator:
+    """Runs constraint propagation over the all-different constraints of a problem."""
+
+    def __init__(self, level, domains, vconstraints):
+        """
+        :param level: one of PROPAGATION_LEVELS
+        :param domains: the dict of {variable: [domain values], ...}
+        :param vconstraints: dict of {variable: [(constraintObject, [vars in constraint]), ...], ...}
+        """
+        if level not in PROPAGATION_LEVELS:
+            raise ValueError('Unknown propagation level {!r}, choose from {}'.format(level, PROPAGATION_LEVELS))
+        self.level = PROPAGATION_LEVELS.index(level)
+
+        self.units = []
+        seen = set()
+        for variable in domains:
+            for constraint, variables in vconstraints[variable]:
+                if isinstance(constraint, AllDifferentConstraint) and id(constraint) not in seen:
+                    seen.add(id(constraint))
+                    self.units.append(list(variables))
+
+        self.units_of = {variable: [] for variable in domains}
+        self.neighbours = {variable: set() for variable in domains}
+        for position, unit in enumerate(self.units):
+            for variable in unit:
+                self.units_of[variable].append(position)
+                self.neighbours[variable].update(unit)
+        for variable in domains:
+            self.neighbours[variable].discard(variable)
+
+        # hidden singles only hold in units that have to use every one of their values (like sudoku units)
+        self.unit_values = []
+        for unit in self.units:
+            values = set()
+            for variable in unit:
+                values.update(domains[variable])
+            self.unit_values.append(values if len(values) == len(unit) else None)
+
+    def propagate(self, changed, domains, assignments):
+        """
+        Propagates the changes of some domains (or assignments) to a fixpoint.
+
+        :param changed: the variables whose domains changed since the last fixpoint
+        :param domains: the dict of {variable: [domain values], ...}
+        :param assignments: a dict of {variable: value, ...}
+        :return: a tuple (whether no domain was wiped out, set of variables whose domains were pruned)
+        """
+        touched = set()
+        pending = set(changed)
+
+        while pending:
+            current = pending
+            pending = set()
+
+            # arc consistency: a variable with a single value removes it from its unassigned neighbours
+            for variable in current:
+                if variable in assignments:
+                    value = assignments[variable]
+                elif len(domains[variable]) == 1:
+                    value = domains[variable][0]
+                else:
+                    continue
+
+                for neighbour in self.neighbours[variable]:
+                    if neighbour not in assignments:
+                        domain = domains[neighbour]
+                        if value in domain:
+                            domain.hideValue(value)
+                            touched.add(neighbour)
+                            pending.add(neighbour)
+                            if not domain:
+                                return False, touched
+
+            if self.level < 2:
+                continue
+
+            units = set(position for variable in current for position in self.units_of[variable])
+            for position in units:
+                if not self._hidden_singles(position, domains, assignments, touched, pending):
+                    return False, touched
+                if self.level >= 3 and not self._naked_subsets(position, domains, assignments, touched, pending):
+                    return False, touched
+
+        return True, touched
+
+    def _hidden_singles(self, position, domains, assignments, touched, pending):
+        """
+        Reduces the variables that are the only place for a value of a unit to that value.
+
+        :return: False if some value of the unit fits nowhere
+        """
+        values = self.unit_values[position]
+        if values is None:
+            return True
+
+        places = {}
+        taken = set()
+        for variable in self.units[position]:
+            if variable in assignments:
+                taken.add(assignments[variable])
+            else:
+                for value in domains[variable]:
+                    places.setdefault(value, []).append(variable)
+
+        for value in values:
+            if value in taken:
+                continue
+
+            place = places.get(value)
+            if not place:
+                return False
+
+            if len(place) == 1:
+                domain = domains[place[0]]
+                if value not in domain:
+                    # this variable already became the only place of another value
+                    return False
+                if len(domain) > 1:
+                    for other in domain[:]:
+                        if other != value:
+                            domain.hideValue(other)
+                    touched.add(place[0])
+                    pending.add(place[0])
+
+        return True
+
+    def _naked_subsets(self, position, domains, assignments, touched, pending):
+        """
+        Removes the values of naked pairs and triples from the other variables of a unit.
+
+        :return: False if some k variables of the unit share fewer than k values
+        """
+        unit = [variable for variable in self.units[position] if variable not in assignments]
+
+        for size in (2, 3):
+            small = [variable for variable in unit if 1 < len(domains[variable]) <= size]
+
+            for subset in combinations(small, size):
+                values = set()
+                for variable in subset:
+                    values.update(domains[variable])
+
+                if len(values) < size:
+                    return False
+                if len(values) > size:
+                    continue
+
+                for variable in unit:
+                    if variable not in subset:
+                        domain = domains[variable]
+                        hidden = [value for value in domain if value in values]
+                        if hidden:
+                            for value in hidden:
+                                domain.hideValue(value)
+                            touched.add(variable)
+                            pending.add(variable)
+                            if not domain:
+                                return False
+
+        return True
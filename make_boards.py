@@ -1,63 +1,258 @@
-from bs4 import BeautifulSoup
-import requests
-import csv
-
-
-def generate():
-    """
-    Makes post requests to a website to generate 16 by 16 sudoku boards. Uses BeautifulSoup to parse the HTML
-    and then writes to a CSV.
-    """
-    with open('jumbo_size_sudokus.csv', 'w') as csvfile:
-        writer = csv.writer(csvfile, delimiter=',')
-
-        # Can change this for more puzzles, each post request makes 5 puzzles
-        for i in range(10):
-            # An array of arrays that are 256 elements of a 16 by 16 sudoku
-            big_puzzles = []
-            
-            # niv 1 is easy, niv 2 is 'confirmed'
-            form = {'niv': 1}
-            url = "https://www.sudoku-puzzles-online.com/cgi-bin/hexadoku/print-5-grid-hexadoku.cgi"
-            r = requests.post(url, data=form)
-            html = r.text
-
-            soup = BeautifulSoup(html, 'lxml')  # Parse the HTML as a string
-
-            # Find all the tables with the class of grid since these are the sudoku tables
-            tables = soup.find_all('table', class_="grid")
-
-            # For every sudoku on the page
-            for table in tables:
-                new_table = []
-                rows = table.find_all('tr')
-
-                # Iterate through all rows
-                for k in rows:
-                    # Iterate through each entry in the row
-                    for j in k.find_all('td'):
-                        number = 0
-                        if j.contents[0] == 'A':
-                            number = 11
-                        elif j.contents[0] == 'B':
-                            number = 12
-                        elif j.contents[0] == 'C':    
-                            number = 13
-                        elif j.contents[0] == 'D':
-                            number = 14
-                        elif j.contents[0] == 'E':
-                            number = 15
-                        elif j.contents[0] == 'F':
-                            number = 16
-                        elif j.contents[0] == ' ':
-                            number = 0
-                        elif j.contents[0] == 'Â\xa0':
-                            number = 0
-                        else:
-                            number = int(j.contents[0])+1    
-                        new_table.append(number)
-
-                big_puzzles.append(new_table)
-
-            for puzzle in big_puzzles:
-                writer.writerow(puzzle[i] for i in range(len(puzzle)))
+"""
+Offline generator of unique-solution sudoku puzzles
+
+A puzzle starts from a random complete grid: the subsquares on the diagonal don't share a row or column, so they are
+filled with independent random permutations, and the Dancing Links solver completes the rest. Clues are then removed
+in random order, keeping a removal only if the puzzle still has exactly one solution (and isn't harder than the
+requested difficulty), until the requested number of clues is reached or no clue can be removed anymore.
+
+Difficulties are rated by the inference needed to solve a puzzle without search:
+    easy   - naked and hidden singles
+    medium - naked pairs and triples as well
+    hard   - search
+
+Every puzzle has its own random generator, seeded from the base seed and its position, so a corpus is reproducible
+whatever the number of worker processes.
+
+"""
+import random
+import sys
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from classes import Board
+from corpus import CorpusWriter
+from dlx import DancingLinksSolver
+from helper_functions import PUZZLE_FORMATS, format_puzzle, problem_template, puzzle_domains
+from inference import Propagator
+from native import count_solutions
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+MAX_ATTEMPTS = 20       # complete grids tried per puzzle before giving up on the clue count / difficulty targets
+
+# propagation level solving the puzzles of every difficulty but hard
+_RATING_LEVELS = (('easy', 'singles'), ('medium', 'pairs'))
+
+
+def random_grid(board_size, rng):
+    """
+    Makes a random complete grid.
+
+    :param board_size: the side length of the board (n^2)
+    :param rng: the random.Random to draw from
+    :return: a solved 2D array board
+    """
+    subsquare_size = int(board_size ** 0.5)
+    solution = None
+
+    # some diagonals can't be completed (e.g. for 4x4 boards), draw new ones until one can
+    while solution is None:
+        grid = [[0] * board_size for _ in range(board_size)]
+        for start in range(0, board_size, subsquare_size):
+            values = rng.sample(range(1, board_size + 1), board_size)
+            for k, value in enumerate(values):
+                grid[start + k // subsquare_size][start + k % subsquare_size] = value
+
+        solution = DancingLinksSolver().solve_board(Board(grid))
+
+    return [[solution[row * board_size + col] for col in range(board_size)] for row in range(board_size)]
+
+
+def is_unique(puzzle):
+    """
+    :param puzzle: a 2D array board
+    :return: whether the puzzle has exactly one solution
+    """
+    return count_solutions(Board(puzzle), limit=2) == 1
+
+
+def rate(puzzle):
+    """
+    Rates the difficulty of a puzzle with a unique solution.
+
+    :param puzzle: a 2D array board
+    :return: one of DIFFICULTIES
+    """
+    board = Board(puzzle)
+    constraints, vconstraints = problem_template(board.board_size)
+
+    for difficulty, level in _RATING_LEVELS:
+        domains = puzzle_domains(board)
+        consistent, _ = Propagator(level, domains, vconstraints).propagate(domains, domains, {})
+        if consistent and all(len(domain) == 1 for domain in domains.values()):
+            return difficulty
+
+    return 'hard'
+
+
+def make_puzzle(solution, rng, clues=None, difficulty=None):
+    """
+    Removes clues from a complete grid while the puzzle keeps a unique solution.
+
+    :param solution: a solved 2D array board (left unchanged)
+    :param rng: the random.Random to draw from
+    :param clues: stop at this many clues (default: remove as many as possible)
+    :param difficulty: one of DIFFICULTIES, removals making the puzzle harder than this are undone
+    :return: a 2D array board
+    """
+    size = len(solution)
+    puzzle = [row[:] for row in solution]
+    limit = DIFFICULTIES.index(difficulty) if difficulty in DIFFICULTIES[:-1] else None
+    remaining = size ** 2
+
+    squares = list(range(size ** 2))
+    rng.shuffle(squares)
+
+    for index in squares:
+        if clues is not None and remaining <= clues:
+            break
+
+        row, col = divmod(index, size)
+        puzzle[row][col] = 0
+        if is_unique(puzzle) and (limit is None or DIFFICULTIES.index(rate(puzzle)) <= limit):
+            remaining -= 1
+        else:
+            puzzle[row][col] = solution[row][col]
+
+    return puzzle
+
+
+def generate_puzzle(board_size, clues=None, difficulty=None, seed=0, index=0):
+    """
+    Generates one puzzle meeting the targets, trying new complete grids until one does.
+
+    :param board_size: the side length of the board (n^2)
+    :param clues: the number of clues of the puzzle (default: as few as the removal order reaches)
+    :param difficulty: one of DIFFICULTIES (default: any)
+    :param seed: the base seed of the corpus
+    :param index: the position of the puzzle in the corpus
+    :return: a tuple (puzzle, solution) of 2D array boards
+    """
+    rng = random.Random('{}:{}'.format(seed, index))
+
+    for attempt in range(MAX_ATTEMPTS):
+        solution = random_grid(board_size, rng)
+        puzzle = make_puzzle(solution, rng, clues, difficulty)
+
+        if clues is not None and sum(1 for row in puzzle for value in row if value) > clues:
+            continue
+        if difficulty is not None and rate(puzzle) != difficulty:
+            continue
+        return puzzle, solution
+
+    raise RuntimeError('No {}x{} puzzle with {} clues and difficulty {} in {} attempts'.format(
+        board_size, board_size, clues if clues is not None else 'any', difficulty or 'any', MAX_ATTEMPTS))
+
+
+def _generate_worker(task):
+    return generate_puzzle(*task)
+
+
+def generate_puzzles(count, board_size, clues=None, difficulty=None, seed=0, workers=1):
+    """
+    Generates puzzles, in parallel processes if more than one worker is used.
+
+    :param count: the number of puzzles
+    :param board_size: the side length of the boards (n^2)
+    :param clues: the number of clues of every puzzle (default: as few as the removal order reaches)
+    :param difficulty: one of DIFFICULTIES (default: any)
+    :param seed: the base seed, the same seed always generates the same puzzles
+    :param workers: number of processes generating puzzles
+    :return: a generator of (puzzle, solution) tuples of 2D array boards, in order
+    """
+    if difficulty is not None and difficulty not in DIFFICULTIES:
+        raise ValueError('Unknown difficulty {!r}, choose from {}'.format(difficulty, DIFFICULTIES))
+
+    tasks = ((board_size, clues, difficulty, seed, index) for index in range(count))
+
+    if workers <= 1:
+        for task in tasks:
+            yield _generate_worker(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        for task in tasks:
+            pending.append(executor.submit(_generate_worker, task))
+
+            # keep a couple of puzzles per worker in flight, writing them out in order
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def main():
+    """
+    This script generates a corpus of sudoku puzzles with unique solutions.
+
+    Usage: python make_boards.py output_file count [--size subsquare_length] [--clues clue_count]
+                                 [--difficulty difficulty] [--seed seed] [--workers worker_count] [--format format]
+
+    output_file: name of the file to be written
+    count: number of puzzles
+    subsquare_length: n = 2...5 for 4x4 to 25x25 puzzles (default 3)
+    clue_count: number of clues of every puzzle (default: remove clues until none can go)
+    difficulty: easy, medium or hard (default: any)
+    seed: base random seed, the same seed generates the same corpus (default 0)
+    worker_count: number of processes generating puzzles (default 1)
+    format: symbols (the 3x3 csv format, default for 9x9), flat (the jumbo format, default otherwise), grid (the big
+            puzzle format) or corpus (a binary corpus storing the solutions too)
+    """
+    if len(sys.argv) < 3:
+        print('Error: bad input.')
+        return
+
+    output_file = sys.argv[1]
+    try:
+        count = int(sys.argv[2])
+    except ValueError:
+        print('Error: bad puzzle count.')
+        return
+
+    options = {}
+    for name, convert, default in (('--size', int, 3), ('--clues', int, None), ('--difficulty', str, None),
+                                   ('--seed', int, 0), ('--workers', int, 1), ('--format', str, None)):
+        if name in sys.argv:
+            try:
+                options[name] = convert(sys.argv[sys.argv.index(name) + 1])
+            except (ValueError, IndexError):
+                print('Error: bad {} option.'.format(name[2:]))
+                return
+        else:
+            options[name] = default
+
+    if not 2 <= options['--size'] <= 5:
+        print('Error: bad subsquare size.')
+        return
+    board_size = options['--size'] ** 2
+
+    if options['--difficulty'] is not None and options['--difficulty'] not in DIFFICULTIES:
+        print('Error: bad difficulty.')
+        return
+
+    style = options['--format'] or ('symbols' if board_size == 9 else 'flat')
+    if style not in PUZZLE_FORMATS + ('corpus',):
+        print('Error: bad format.')
+        return
+
+    puzzles = generate_puzzles(count, board_size, options['--clues'], options['--difficulty'], options['--seed'],
+                               options['--workers'])
+
+    if style == 'corpus':
+        with CorpusWriter(output_file, board_size, solutions=True) as writer:
+            for puzzle, solution in puzzles:
+                writer.write(puzzle, solution)
+    else:
+        with open(output_file, 'w') as f:
+            for puzzle, solution in puzzles:
+                f.write('\n'.join(format_puzzle(puzzle, style)) + '\n')
+                f.flush()
+
+
+# run main function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+"""
+Native bitmask sudoku engine
+
+Instead of building a generic CSP, the row, column and subsquare candidates of a board are tracked as integer
+bitmasks (bit v-1 set means value v is used in that unit), so computing the domain of a square is a couple of
+bitwise operations and the remaining values are counted / enumerated with popcount and lowest-bit tricks.
+
+"""
+import random
+
+from classes import Board, CompactBoard, unit_tables
+
+
+def bits_to_values(mask):
+    """
+    Expands a candidate bitmask into the list of values it contains
+
+    :param mask: an integer whose bit v-1 is set when value v is a candidate
+    :return: the candidate values in ascending order
+    """
+    values = []
+    while mask:
+        low = mask & -mask
+        values.append(low.bit_length())
+        mask ^= low
+    return values
+
+
+class NativeSudokuSolver:
+    """
+    Backtracking sudoku solver working directly on bitmasks, supporting the same heuristic identifiers as
+    HeuristicRecursiveBacktrackingSolver.
+    """
+
+    def __init__(self, value_heuristic_id=None, variable_heuristic_id=None, forwardcheck=True, node_limit=None):
+        """
+        :param value_heuristic_id: string identifier of the value heuristic to use
+                                   choose from {random, lcv, least_used}
+                                   leave blank for no value heuristic
+        :param variable_heuristic_id: string identifier of the variable heuristic to use
+                                      choose from {degree, mrv, random, deg+mrv, mrv+random}
+                                      leave blank for no variable heuristic
+        :param forwardcheck: if false, the peers of an assigned square are not checked for an empty domain
+        :param node_limit: if given, a search gives up (returns None and sets cutoff) after this many nodes
+        """
+        if node_limit is not None and node_limit < 1:
+            raise ValueError('A node limit must be at least 1 node')
+
+        self._forwardcheck = forwardcheck
+        self._node_limit = node_limit
+        self.cutoff = False     # whether the last search gave up after its node limit
+
+        self._variable_heuristic_id = variable_heuristic_id
+        self._value_heuristic_id = value_heuristic_id
+
+    def solve_board(self, board, candidates=None):
+        """
+        Solves a board.
+
+        :param board: the Board to be solved (left unchanged)
+        :param candidates: optional list of candidate bitmasks per square restricting the values tried (e.g. from
+                           presolve)
+        :return: a dict of {index: value, ...} for every square, or None if the board has no solution (or the node
+                 limit was reached)
+        """
+        self.cutoff = False
+        size = board.board_size
+        allowed = [(1 << size) - 1] * size ** 2 if candidates is None else [int(mask) for mask in candidates]
+
+        tables = unit_tables(size)
+        row_of, col_of, box_of, peers = tables.row_of, tables.col_of, tables.subsquare_of, tables.peers
+
+        cells = [board.get_value(index) for index in range(size ** 2)]
+        rows = [0] * size
+        cols = [0] * size
+        boxes = [0] * size
+        used = [0] * (size + 1)     # used[v] is the number of squares currently holding value v
+
+        for index, value in enumerate(cells):
+            if value:
+                bit = 1 << (value - 1)
+                if (rows[row_of[index]] | cols[col_of[index]] | boxes[box_of[index]]) & bit:
+                    return None
+                rows[row_of[index]] |= bit
+                cols[col_of[index]] |= bit
+                boxes[box_of[index]] |= bit
+                used[value] += 1
+
+        empty = [index for index, value in enumerate(cells) if not value]
+        variable_heuristic_id = self._variable_heuristic_id
+        value_heuristic_id = self._value_heuristic_id
+        forwardcheck = self._forwardcheck
+        node_limit = self._node_limit
+        nodes = 0
+
+        def candidate_mask(index):
+            return allowed[index] & ~(rows[row_of[index]] | cols[col_of[index]] | boxes[box_of[index]])
+
+        def select_square():
+            """Returns (position in empty, candidate mask) of the next square, or (None, 0) on a wipeout."""
+            if variable_heuristic_id in ('mrv', 'deg+mrv', 'mrv+random'):
+                best = None
+                best_mask = 0
+                best_count = size + 1
+                ties = []
+                for position, index in enumerate(empty):
+                    mask = candidate_mask(index)
+                    count = mask.bit_count()
+                    if count == 0:
+                        return None, 0
+                    if count < best_count:
+                        best, best_mask, best_count = position, mask, count
+                        ties = [position]
+                    elif count == best_count:
+                        ties.append(position)
+                        if index < empty[best]:
+                            best, best_mask = position, mask
+                if variable_heuristic_id == 'mrv+random' and best_count > 1:
+                    best = random.choice(ties)
+                    best_mask = candidate_mask(empty[best])
+                return best, best_mask
+            if variable_heuristic_id == 'random':
+                position = random.randrange(len(empty))
+            else:
+                # degree is the same for every square of a sudoku, so it reduces to the natural order
+                position = empty.index(min(empty))
+            return position, candidate_mask(empty[position])
+
+        def order_values(mask):
+            values = bits_to_values(mask)
+            if value_heuristic_id == 'random':
+                random.shuffle(values)
+            elif value_heuristic_id == 'lcv':
+                # count how many open squares still have each value available
+                count = {value: 0 for value in values}
+                for index in empty:
+                    open_mask = candidate_mask(index) & mask
+                    while open_mask:
+                        low = open_mask & -open_mask
+                        count[low.bit_length()] += 1
+                        open_mask ^= low
+                values.sort(key=lambda value: count[value])
+            elif value_heuristic_id == 'least_used':
+                values.sort(key=lambda value: used[value])
+            return values
+
+        stack = []      # frames [position in empty, square, iterator over the untried values, value assigned or 0]
+
+        while True:
+            if not empty:
+                return dict(enumerate(cells))
+
+            if node_limit is not None:
+                if nodes == node_limit:
+                    self.cutoff = True
+                    return None
+                nodes += 1
+
+            position, mask = select_square()
+            if position is not None:
+                index = empty[position]
+                empty[position] = empty[-1]
+                empty.pop()
+                stack.append([position, index, iter(order_values(mask)), 0])
+
+            # assign the next value of the deepest square that has one passing the forward check, backtracking over
+            # the others
+            while stack:
+                frame = stack[-1]
+                position, index, values, value = frame
+                row, col, box = row_of[index], col_of[index], box_of[index]
+                if value:
+                    bit = 1 << (value - 1)
+                    rows[row] ^= bit
+                    cols[col] ^= bit
+                    boxes[box] ^= bit
+                    used[value] -= 1
+                    cells[index] = 0
+                    frame[3] = 0
+
+                for value in values:
+                    bit = 1 << (value - 1)
+                    rows[row] |= bit
+                    cols[col] |= bit
+                    boxes[box] |= bit
+                    used[value] += 1
+                    cells[index] = value
+
+                    if not forwardcheck or all(cells[peer] or candidate_mask(peer) for peer in peers[index]):
+                        frame[3] = value
+                        break
+
+                    rows[row] ^= bit
+                    cols[col] ^= bit
+                    boxes[box] ^= bit
+                    used[value] -= 1
+                    cells[index] = 0
+
+                if frame[3]:
+                    break
+
+                stack.pop()
+                empty.append(index)
+                empty[position], empty[-1] = empty[-1], empty[position]
+            else:
+                return None
+
+
+def count_solutions(board, limit=2, candidates=None):
+    """
+    Counts the solutions of a board, stopping as soon as limit of them are found (e.g. limit=2 tells whether a
+    puzzle is unique).
+
+    The search keeps the values used by every row, column and subsquare as bitmasks and branches on the square with
+    the fewest candidates, or on a hidden single if no square has a single candidate, on an explicit stack so that
+    boards of any size fit.
+
+    :param board: the Board to be counted (left unchanged)
+    :param limit: stop counting at this many solutions (None to count all of them)
+    :param candidates: optional list of candidate bitmasks per square restricting the values tried
+    :return: the number of solutions, at most limit
+    """
+    size = board.board_size
+    full = (1 << size) - 1
+    allowed = [full] * size ** 2 if candidates is None else [int(mask) for mask in candidates]
+
+    tables = unit_tables(size)
+    row_of, col_of, box_of = tables.row_of, tables.col_of, tables.subsquare_of
+
+    rows = [0] * size
+    cols = [0] * size
+    boxes = [0] * size
+    cells = [0] * size ** 2     # bit of the value of every square, 0 while it is open
+    empty = []
+
+    for index in range(size ** 2):
+        value = board.get_value(index)
+        if not value:
+            empty.append(index)
+            continue
+        bit = 1 << (value - 1)
+        if (rows[row_of[index]] | cols[col_of[index]] | boxes[box_of[index]] | ~allowed[index]) & bit:
+            return 0
+        rows[row_of[index]] |= bit
+        cols[col_of[index]] |= bit
+        boxes[box_of[index]] |= bit
+        cells[index] = bit
+
+    # the squares of every unit with the masks of the values used in it
+    units = [(unit, masks, position) for masks, group in ((rows, tables.rows), (cols, tables.cols),
+                                                          (boxes, tables.subsquares))
+             for position, unit in enumerate(group)]
+
+    count = 0
+    stack = []      # frames [position in empty, square, untried candidate mask, bit of the value assigned or 0]
+
+    while True:
+        if not empty:
+            count += 1
+            if limit is not None and count >= limit:
+                return count
+        else:
+            # choose the open square with the fewest candidates
+            best = None
+            best_mask = 0
+            best_count = size + 1
+            for position, index in enumerate(empty):
+                mask = allowed[index] & ~(rows[row_of[index]] | cols[col_of[index]] | boxes[box_of[index]])
+                mask_count = mask.bit_count()
+                if mask_count < best_count:
+                    best, best_mask, best_count = position, mask, mask_count
+                    if mask_count <= 1:
+                        break
+
+            # without a naked single, a value with a single place left in some unit (a hidden single) is forced
+            if best_count > 1:
+                for unit, masks, position in units:
+                    once = twice = 0
+                    for index in unit:
+                        if not cells[index]:
+                            mask = allowed[index] & ~(rows[row_of[index]] | cols[col_of[index]] |
+                                                      boxes[box_of[index]])
+                            twice |= once & mask
+                            once |= mask
+
+                    needed = full & ~masks[position]
+                    if needed & ~once:
+                        best_mask = 0       # a value fits nowhere in the unit
+                        break
+                    single = needed & ~twice
+                    if single:
+                        single &= -single
+                        index = next(index for index in unit if not cells[index] and
+                                     allowed[index] & ~(rows[row_of[index]] | cols[col_of[index]] |
+                                                        boxes[box_of[index]]) & single)
+                        best, best_mask = empty.index(index), single
+                        break
+
+            if best_mask:
+                index = empty[best]
+                empty[best] = empty[-1]
+                empty.pop()
+                stack.append([best, index, best_mask, 0])
+
+        # assign the next candidate of the deepest square that has one left, backtracking over the others
+        while stack:
+            frame = stack[-1]
+            position, index, mask, bit = frame
+            row, col, box = row_of[index], col_of[index], box_of[index]
+            if bit:
+                rows[row] ^= bit
+                cols[col] ^= bit
+                boxes[box] ^= bit
+                cells[index] = 0
+
+            if mask:
+                bit = mask & -mask
+                frame[2] = mask ^ bit
+                frame[3] = bit
+                rows[row] |= bit
+                cols[col] |= bit
+                boxes[box] |= bit
+                cells[index] = bit
+                break
+
+            stack.pop()
+            empty.append(index)
+            empty[position], empty[-1] = empty[-1], empty[position]
+        else:
+            return count
+
+
+def iter_solution_counts(puzzles, limit=2):
+    """
+    Lazily counts the solutions of a stream of puzzles, e.g. to check the uniqueness of every puzzle read by
+    helper_functions.read_puzzles.
+
+    :param puzzles: an iterable of 2D array boards (or Boards)
+    :param limit: stop counting the solutions of a puzzle at this many (None to count all of them)
+    :return: a generator of solution counts, in the order of the puzzles
+    """
+    for puzzle in puzzles:
+        yield count_solutions(puzzle if isinstance(puzzle, (Board, CompactBoard)) else CompactBoard(puzzle), limit)
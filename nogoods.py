@@ -0,0 +1,67 @@
+"""
+Bounded store of nogoods learned by the backjumping search
+
+A nogood is a set of (variable, value) assignments that can't all be part of a solution. The backjumping search
+learns one from the conflict set of every variable that runs out of values, and skips a value whenever assigning it
+would complete a stored nogood. Only the most recently learned or used nogoods are kept.
+
+"""
+from collections import OrderedDict
+
+
+class NogoodStore:
+    """Nogoods indexed by their (variable, value) pairs, evicting the least recently used ones beyond a capacity."""
+
+    def __init__(self, capacity):
+        """
+        :param capacity: the most nogoods kept at once
+        """
+        if capacity < 1:
+            raise ValueError('A nogood store needs a capacity of at least 1')
+
+        self.capacity = capacity
+        self._nogoods = OrderedDict()       # nogood -> None, least recently used first
+        self._index = {}                    # (variable, value) -> set of nogoods containing it
+
+    def __len__(self):
+        return len(self._nogoods)
+
+    def add(self, nogood):
+        """
+        Stores a nogood, evicting the least recently used one if the store is full.
+
+        :param nogood: a frozenset of (variable, value) pairs
+        """
+        if nogood in self._nogoods:
+            self._nogoods.move_to_end(nogood)
+            return
+
+        self._nogoods[nogood] = None
+        for pair in nogood:
+            self._index.setdefault(pair, set()).add(nogood)
+
+        if len(self._nogoods) > self.capacity:
+            evicted, _ = self._nogoods.popitem(last=False)
+            for pair in evicted:
+                nogoods = self._index[pair]
+                nogoods.discard(evicted)
+                if not nogoods:
+                    del self._index[pair]
+
+    def violated(self, variable, value, assignments):
+        """
+        Finds a stored nogood that assigning a value to a variable would complete.
+
+        :param variable: the variable about to be assigned
+        :param value: its value
+        :param assignments: a dict of the current {variable: value, ...}
+        :return: the nogood, or None if the assignment completes none
+        """
+        for nogood in self._index.get((variable, value), ()):
+            for other, other_value in nogood:
+                if other != variable and assignments.get(other) != other_value:
+                    break
+            else:
+                self._nogoods.move_to_end(nogood)
+                return nogood
+        return None
@@ -0,0 +1,168 @@
+"""
+Portfolio solver racing several solver configurations on every puzzle
+
+No single pair of heuristics is fastest on every puzzle, and the runtimes of one configuration are heavy-tailed, so
+every configuration searches the same puzzle in its own process and the first answer wins. The processes of the
+losing configurations are terminated (there is no way to interrupt a search from the outside) and replaced by fresh
+ones right away, so they are ready again by the next puzzle.
+
+"""
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+from classes import Board
+from helper_functions import solve_board
+from solvers import make_solver
+
+
+def _race_worker(solver, connection):
+    """
+    Main loop of a portfolio process: solves the puzzles received on the connection until it is closed.
+
+    :param solver: the solver configuration of this process
+    :param connection: a Connection receiving (2D array board, candidates) tasks, answered with (solution dict or
+                       None, SearchStats or None)
+    """
+    while True:
+        try:
+            puzzle, candidates = connection.recv()
+        except EOFError:
+            return
+
+        board = Board(puzzle)
+        if solve_board(board, solver, candidates):
+            solution = {index: board.get_value(index) for index in range(board.board_size ** 2)}
+        else:
+            solution = None
+        connection.send((solution, getattr(solver, 'stats', None)))
+
+
+class PortfolioSolver:
+    """
+    Solves every board with several solvers in parallel processes, keeping the first answer.
+
+    After every solve, winner names the configuration that answered first and stats holds its SearchStats (if it
+    collects them); wins counts the puzzles every configuration won so far.
+    """
+
+    def __init__(self, solvers, names=None):
+        """
+        :param solvers: the solver configurations to race, e.g. HeuristicRecursiveBacktrackingSolvers with different
+                        heuristics, or other engines (each one is copied to its own process)
+        :param names: a name per solver used to report the winner (default: the class name and position)
+        """
+        if not solvers:
+            raise ValueError('A portfolio needs at least one solver')
+
+        self.solvers = list(solvers)
+        self.names = list(names) if names is not None else \
+            ['{}#{}'.format(type(solver).__name__, i) for i, solver in enumerate(self.solvers)]
+        if len(self.names) != len(self.solvers):
+            raise ValueError('Expected a name per solver')
+
+        self.winner = None
+        self.stats = None
+        self.wins = {name: 0 for name in self.names}
+
+        self._workers = [None] * len(self.solvers)     # (Process, Connection) per solver, started on demand
+
+    def __getstate__(self):
+        # processes are not copied: a copy (e.g. in a worker of helper_functions.iter_solutions) starts its own
+        return self.solvers, self.names
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def _start(self, position):
+        connection, child_connection = Pipe()
+        process = Process(target=_race_worker, args=(self.solvers[position], child_connection), daemon=True)
+        process.start()
+        child_connection.close()
+        self._workers[position] = process, connection
+
+    def _stop(self, position):
+        process, connection = self._workers[position]
+        process.terminate()
+        process.join()
+        connection.close()
+        self._workers[position] = None
+
+    def solve_board(self, board, candidates=None):
+        """
+        Races the solvers on a board.
+
+        :param board: the Board to be solved (left unchanged)
+        :param candidates: optional list of candidate bitmasks per square restricting the search
+        :return: a dict of {index: value, ...} for every square, or None if the board has no solution
+        """
+        for position, worker in enumerate(self._workers):
+            if worker is None:
+                self._start(position)
+
+        task = (board.board, candidates)
+        for process, connection in self._workers:
+            connection.send(task)
+
+        connections = [connection for process, connection in self._workers]
+        ready = wait(connections)
+        position = min(connections.index(connection) for connection in ready)     # ties go to the first solver
+
+        try:
+            solution, self.stats = connections[position].recv()
+        except EOFError:
+            self.close()
+            raise RuntimeError('portfolio solver {} died'.format(self.names[position]))
+
+        self.winner = self.names[position]
+        self.wins[self.winner] += 1
+
+        # the other searches can't be interrupted: replace their processes
+        for other in range(len(self._workers)):
+            if other != position:
+                if connections[other] in ready:
+                    connections[other].recv()       # finished at the same time, its process is still usable
+                else:
+                    self._stop(other)
+                    self._start(other)
+
+        return solution
+
+    def close(self):
+        """
+        Terminates the processes of the portfolio.
+        """
+        for position, worker in enumerate(self._workers):
+            if worker is not None:
+                self._stop(position)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def parse_portfolio(spec, propagate='fc'):
+    """
+    Builds the solvers of a portfolio from a comma separated list of configurations: var_id/val_id for the csp
+    engine with those heuristics, native:var_id/val_id for the native engine, or dlx.
+
+    :param spec: the configurations, e.g. 'mrv/lcv,deg+mrv/least_used,dlx'
+    :param propagate: propagation level of the csp configurations
+    :return: a tuple (list of solvers, list of their names)
+    """
+    solvers = []
+    names = []
+    for name in spec.split(','):
+        if name == 'dlx':
+            engine, variable_id, value_id = 'dlx', None, None
+        else:
+            engine, _, heuristics = name.rpartition(':')
+            variable_id, slash, value_id = heuristics.partition('/')
+            if not slash:
+                raise ValueError('Bad portfolio configuration {!r}'.format(name))
+
+        solvers.append(make_solver(engine or 'csp', variable_id, value_id, propagate))
+        names.append(name)
+
+    return solvers, names
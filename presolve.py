@@ -0,0 +1,110 @@
+"""
+Batched constraint propagation over many puzzles at once
+
+The candidates of every square of a whole batch of puzzles are held as one (N, n^4) array of bitsets (bit v-1 set
+means value v is still possible), and naked singles (a square with a single candidate) and hidden singles (a value
+with a single possible square in a row, column or subsquare) are filled in for all puzzles at once with NumPy
+operations until nothing changes anymore. Easy puzzles are solved completely this way, the others leave with
+reduced candidates for the search.
+
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from classes import unit_tables
+
+# result of presolve: the boards with every square found filled in (N, n^2, n^2), the candidate bitsets of every
+# square (N, n^4), and masks of the puzzles that are solved / proven to have no solution
+PresolveResult = namedtuple('PresolveResult', ['boards', 'candidates', 'solved', 'contradiction'])
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    def _popcount(x):
+        # SWAR popcount for NumPy < 2.0
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def presolve(boards):
+    """
+    Applies naked and hidden singles to a batch of puzzles until a fixpoint is reached.
+
+    :param boards: an (N, n^2, n^2) array (or nested lists) of puzzles of the same size, 0 for empty squares, or an
+                   (N, n^4) array of flat puzzles (e.g. views into a binary corpus)
+    :return: a PresolveResult
+    """
+    boards = np.array(boards, dtype=np.int64)
+    if boards.ndim == 2:
+        side = int(round(boards.shape[1] ** 0.5))
+        boards = boards.reshape(len(boards), side, side)
+    count, size = boards.shape[0], boards.shape[1]
+
+    tables = unit_tables(size)
+    units = np.array(tables.units)                  # rows, then columns, then subsquares
+    rows_of = np.array(tables.row_of)
+    cols_of = np.array(tables.col_of) + size
+    subsquares_of = np.array(tables.subsquare_of) + 2 * size
+
+    full = np.uint64((1 << size) - 1)
+    bit_of = np.array([0] + [1 << value for value in range(size)], dtype=np.uint64)
+
+    values = boards.reshape(count, size ** 2)
+    candidates = np.where(values > 0, bit_of[values], full)
+    contradiction = np.zeros(count, dtype=bool)
+    active = np.ones(count, dtype=bool)
+
+    while True:
+        batch = np.flatnonzero(active)
+        if not batch.size:
+            break
+
+        v = values[batch]
+        c = candidates[batch]
+        bits = bit_of[v]
+        empty = v == 0
+
+        # values used in every unit, and repeated values
+        used = np.bitwise_or.reduce(bits[:, units], axis=2)
+        repeated = (_popcount(used) != (~empty)[:, units].sum(axis=2)).any(axis=1)
+
+        # remove the values used by the peers of every empty square
+        c = np.where(empty, c & ~(used[:, rows_of] | used[:, cols_of] | used[:, subsquares_of]), bits)
+        wipeout = (empty & (c == 0)).any(axis=1)
+
+        # values possible in exactly one empty square of a unit
+        unit_candidates = np.where(empty, c, 0)[:, units]
+        once = np.zeros(used.shape, dtype=np.uint64)
+        twice = np.zeros(used.shape, dtype=np.uint64)
+        for position in range(size):
+            square = unit_candidates[:, :, position]
+            twice |= once & square
+            once |= square
+        missing = ((used | once) != full).any(axis=1)      # some value fits nowhere in a unit
+
+        hidden_in_unit = unit_candidates & (once & ~twice)[:, :, None]
+        hidden = np.zeros(c.shape, dtype=np.uint64)
+        for part in range(3):
+            part_units = units[part * size:(part + 1) * size]
+            hidden[:, part_units.ravel()] |= hidden_in_unit[:, part * size:(part + 1) * size].reshape(-1, size ** 2)
+        ambiguous = (_popcount(hidden) > 1).any(axis=1)      # a square is the only place for two values
+
+        # fill in naked and hidden singles
+        naked = empty & (_popcount(c) == 1)
+        found = np.where(naked, c, np.where(empty, hidden, 0))
+        assign = found != 0
+        v = np.where(assign, np.log2(np.maximum(found, 1).astype(np.float64)).astype(np.int64) + 1, v)
+        c = np.where(assign, found, c)
+
+        failed = repeated | wipeout | missing | ambiguous
+        values[batch] = v
+        candidates[batch] = c
+        contradiction[batch] |= failed
+        active[batch] = assign.any(axis=1) & ~failed
+
+    solved = (values > 0).all(axis=1) & ~contradiction
+
+    return PresolveResult(values.reshape(count, size, size), candidates, solved, contradiction)
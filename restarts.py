@@ -0,0 +1,51 @@
+"""
+Restart schedules for the randomized backtracking search
+
+With randomized heuristics, the runtime of a search is heavy-tailed: an unlucky early choice can leave the solver
+exploring a hopeless subtree for a very long time. Cutting the search off after a node budget and restarting it with
+a new random seed avoids waiting for such runs, and letting the budget grow keeps the search complete.
+
+Schedules:
+    luby      - base times the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ...
+    geometric - base, base * factor, base * factor^2, ...
+
+"""
+from itertools import count
+
+RESTART_SCHEDULES = ('luby', 'geometric')
+
+
+def luby(index):
+    """
+    Term of the Luby sequence.
+
+    :param index: position in the sequence, starting at 1
+    :return: the term
+    """
+    while True:
+        # find k with 2^(k-1) <= index < 2^k
+        k = index.bit_length()
+        if index == (1 << k) - 1:
+            return 1 << (k - 1)
+        index -= (1 << (k - 1)) - 1
+
+
+def restart_budgets(schedule, base=100, factor=2.0):
+    """
+    Node budgets of the successive runs of a restarting search.
+
+    :param schedule: one of RESTART_SCHEDULES
+    :param base: node budget of the first run
+    :param factor: growth factor of the geometric schedule
+    :return: an infinite generator of node budgets
+    """
+    if schedule == 'luby':
+        for index in count(1):
+            yield base * luby(index)
+    elif schedule == 'geometric':
+        budget = base
+        while True:
+            yield int(budget)
+            budget *= factor
+    else:
+        raise ValueError('Unknown restart schedule {!r}, choose from {}'.format(schedule, RESTART_SCHEDULES))
@@ -0,0 +1,432 @@
+"""
+Resident solve service answering JSON-lines requests
+
+Instead of paying interpreter startup, imports and solver setup for every batch, the service keeps a warm pool of
+worker processes and answers requests read from stdin (answers go to stdout) or from the connections of a local TCP
+or Unix socket, one JSON object per line:
+
+    request:  {"id": 7, "puzzle": "4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......,",
+               "timeout": 2.5}
+    response: {"id": 7, "status": "solved", "solution": "417369825...", "seconds": 0.0123, "latency": 0.0141}
+
+A puzzle is a 2D array of values or a single line in the 3x3 csv or jumbo format, and its solution comes back in the
+same form. The status is solved, unsolvable, timeout (no answer within the timeout of the request or of the
+service, measured from its arrival) or error; seconds is the solve time in the worker and latency the time from
+arrival to answer. Answers are written as soon as they are ready, so they may come out of order. A request that
+times out before its batch is sent isn't solved at all, but the search of one that times out in a worker is not
+interrupted: the worker stays busy with it (and the rest of its batch) until it ends, so a short timeout bounds the
+latency of an answer, not the work done for it.
+
+Requests are queued and the queue is cut into micro-batches: a batch leaves once it is full or a short delay after
+its first request, and only a couple of batches per worker are in flight. When the workers fall behind, the queue
+fills up and reading stops until there is room again, so a fast client is slowed down instead of growing the
+service's memory.
+
+"""
+import asyncio
+import json
+import random
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from helper_functions import format_puzzle, parse_puzzle, solve_chunk
+from inference import PROPAGATION_LEVELS
+from solvers import ENGINES, make_solver
+
+STATUSES = ('solved', 'unsolvable', 'timeout', 'error')
+
+# solver (and presolve option) of the worker processes, set up once per worker
+_worker_solver = None
+_worker_presolve = False
+
+
+def _init_worker(solver, presolve=False):
+    global _worker_solver, _worker_presolve
+    _worker_solver = solver
+    _worker_presolve = presolve
+
+    # forked workers inherit the parent's random state, reseed so randomized heuristics differ across workers
+    random.seed()
+
+
+def _warm_up():
+    pass
+
+
+def _solve_batch(batch):
+    return solve_chunk(enumerate(batch), _worker_solver, _worker_presolve)
+
+
+class SolveService:
+    """
+    Solves puzzles submitted by coroutines in micro-batches on a warm pool of worker processes.
+
+    Use it as an async context manager (or call start / close), then await solve (or submit) from any number of
+    coroutines.
+    """
+
+    def __init__(self, solver, workers=1, batch_size=16, batch_delay=0.002, queue_size=1024, timeout=None,
+                 presolve=False):
+        """
+        :param solver: the CSP solver to be used, or an engine providing its own solve_board method (copied to every
+                       worker)
+        :param workers: number of worker processes
+        :param batch_size: the most puzzles sent to a worker at once
+        :param batch_delay: seconds a batch waits for more puzzles after its first one
+        :param queue_size: the most puzzles waiting for a batch, submitting blocks while the queue is full
+        :param timeout: default seconds a request may take from its arrival to its answer (None for no limit)
+        :param presolve: whether to fill in naked and hidden singles of every batch before searching (requires NumPy)
+        """
+        if workers < 1 or batch_size < 1 or queue_size < 1:
+            raise ValueError('A solve service needs at least one worker, batch size and queue slot')
+
+        self.solver = solver
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.presolve = presolve
+
+        self._executor = None
+        self._queue = None      # (2D array board, asyncio.Future) per request waiting for a batch
+        self._slots = None      # batches that may still be dispatched
+        self._batcher = None
+
+    async def start(self):
+        """
+        Starts the worker processes and the batching task.
+        """
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.solver, self.presolve))
+        self._queue = asyncio.Queue(self.queue_size)
+        self._slots = asyncio.Semaphore(2 * self.workers)
+
+        # start the workers now: forked later, they would inherit (and keep open) the sockets of connections
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _warm_up) for _ in range(self.workers)))
+
+        self._batcher = loop.create_task(self._dispatch())
+
+    async def close(self):
+        """
+        Stops the batching task and the worker processes.
+        """
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def submit(self, puzzle, timeout=None):
+        """
+        Queues a puzzle, waiting while the queue is full.
+
+        :param puzzle: a 2D array board
+        :param timeout: seconds the request may take (default: the timeout of the service)
+        :return: an awaitable of the response, see answer
+        """
+        received = perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((puzzle, future))
+        return asyncio.ensure_future(self.answer(future, received, self.timeout if timeout is None else timeout))
+
+    async def solve(self, puzzle, timeout=None):
+        """
+        Solves a puzzle.
+
+        :param puzzle: a 2D array board
+        :param timeout: seconds the request may take (default: the timeout of the service)
+        :return: the response, see answer
+        """
+        return await (await self.submit(puzzle, timeout))
+
+    async def answer(self, future, received, timeout):
+        """
+        Waits for the result of a queued puzzle. On a timeout the search is not interrupted, the worker solving the
+        puzzle stays busy until it ends.
+
+        :param future: the future set to the SolveResult of the puzzle
+        :param received: perf_counter() at the arrival of the request
+        :param timeout: seconds the request may take from its arrival, or None
+        :return: a dict with the status of the request (one of STATUSES), the solution as a 2D array board (or
+                 None), the solve time in seconds, the latency in seconds and, if the solver collects them, the
+                 search statistics
+        """
+        response = {'status': 'error', 'solution': None, 'seconds': None}
+
+        try:
+            if timeout is None:
+                result = await future
+            else:
+                result = await asyncio.wait_for(future, max(0.0, timeout - (perf_counter() - received)))
+        except asyncio.TimeoutError:
+            response['status'] = 'timeout'
+        except Exception as e:      # the pool broke or the solver raised
+            response['error'] = '{}: {}'.format(type(e).__name__, e)
+        else:
+            response['seconds'] = result.seconds
+            if result.error is not None:
+                response['error'] = result.error
+            elif result.board is not None:
+                response['status'] = 'solved'
+                response['solution'] = result.board.board
+            else:
+                response['status'] = 'unsolvable'
+            if result.stats is not None:
+                response['stats'] = result.stats.as_dict()
+
+        response['latency'] = perf_counter() - received
+        return response
+
+    async def _dispatch(self):
+        """
+        Cuts the queue into batches and hands them to the worker processes.
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_delay and self._queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.batch_delay)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # requests that timed out while waiting are not solved at all
+            batch = [(puzzle, future) for puzzle, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            await self._slots.acquire()
+            loop.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        """
+        Solves a batch in a worker process and hands out the results.
+        """
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _solve_batch, [puzzle for puzzle, future in batch])
+        except Exception as e:
+            for puzzle, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for result, (puzzle, future) in zip(results, batch):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+
+def _read_request(request):
+    """
+    Checks a parsed request line.
+
+    :return: a tuple (2D array board, text format of the puzzle or None for a 2D array)
+    """
+    if not isinstance(request, dict) or 'puzzle' not in request:
+        raise ValueError('expected an object with a puzzle')
+
+    puzzle = request['puzzle']
+    style = None
+    if isinstance(puzzle, str):
+        style = 'flat' if ',' in puzzle.strip().rstrip(',') else 'symbols'
+        puzzle = parse_puzzle(puzzle)
+
+    # a value out of range would fail in the worker (or keep it searching forever), reject it before it is queued
+    size = len(puzzle) if isinstance(puzzle, list) else 0
+    if int(size ** 0.5) ** 2 != size or size < 4 or \
+            any(not isinstance(row, list) or len(row) != size or
+                any(not isinstance(value, int) or not 0 <= value <= size for value in row) for row in puzzle):
+        raise ValueError('expected a square puzzle of n^2 x n^2 values')
+    return puzzle, style
+
+
+async def serve_lines(service, readline, write):
+    """
+    Answers the requests of one stream of JSON lines until it ends.
+
+    :param service: a started SolveService
+    :param readline: coroutine function returning the next line (empty at the end of the stream)
+    :param write: coroutine function writing a line
+    """
+    pending = set()
+
+    async def respond(request, style, answer):
+        response = await answer
+        if style is not None and response['solution'] is not None:
+            response['solution'] = format_puzzle(response['solution'], style)[0]
+        await write(json.dumps(dict(response, id=request.get('id'))))
+
+    while True:
+        line = await readline()
+        if not line:
+            break
+        if not line.strip():
+            continue
+
+        request = None
+        try:
+            request = json.loads(line)
+            puzzle, style = _read_request(request)
+            timeout = request.get('timeout')
+            if timeout is not None:
+                timeout = float(timeout)
+        except (ValueError, TypeError) as e:
+            # a request that parsed gets its id back, so the client knows which one was rejected
+            request_id = request.get('id') if isinstance(request, dict) else None
+            await write(json.dumps({'id': request_id, 'status': 'error', 'error': 'bad request: {}'.format(e)}))
+            continue
+
+        task = asyncio.ensure_future(respond(request, style, await service.submit(puzzle, timeout)))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending)
+
+
+async def serve_stdio(service):
+    """
+    Answers requests read from stdin on stdout, until stdin is closed.
+
+    :param service: a started SolveService
+    """
+    loop = asyncio.get_running_loop()
+
+    async def readline():
+        # a thread works for stdin from files as well as pipes and terminals
+        return await loop.run_in_executor(None, sys.stdin.readline)
+
+    async def write(line):
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+    await serve_lines(service, readline, write)
+
+
+async def serve_socket(service, host=None, port=None, path=None):
+    """
+    Answers requests on the connections of a local socket, until cancelled.
+
+    :param service: a started SolveService
+    :param host: the address of a TCP socket
+    :param port: the port of a TCP socket
+    :param path: the path of a Unix socket, used instead of host and port
+    """
+    async def connection(reader, writer):
+        async def write(line):
+            writer.write(line.encode() + b'\n')
+            await writer.drain()
+
+        try:
+            await serve_lines(service, reader.readline, write)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    if path is not None:
+        server = await asyncio.start_unix_server(connection, path)
+    else:
+        server = await asyncio.start_server(connection, host, port)
+
+    async with server:
+        await server.serve_forever()
+
+
+async def _serve(service, host, port, path):
+    async with service:
+        if host is None and path is None:
+            await serve_stdio(service)
+        else:
+            await serve_socket(service, host, port, path)
+
+
+def main():
+    """
+    This script runs the solve service.
+
+    Usage: python service.py [--socket host:port] [--unix path] [--engine engine_id] [--variable var_heuristic_id]
+                             [--value val_heuristic_id] [--propagate propagation_level] [--workers worker_count]
+                             [--batch-size count] [--batch-delay seconds] [--queue count] [--timeout seconds]
+                             [--presolve]
+
+    host:port: serve a local TCP socket instead of stdin / stdout
+    path: serve a Unix socket instead of stdin / stdout
+    engine_id: csp (default), native or dlx
+    var_heuristic_id, val_heuristic_id: heuristics of the csp and native engines
+    propagation_level: fc (default), ac3, singles or pairs, for the csp engine
+    worker_count: number of worker processes (default 1)
+    --batch-size: the most puzzles per micro-batch (default 16)
+    --batch-delay: seconds a micro-batch waits for more puzzles (default 0.002)
+    --queue: the most queued puzzles before reading requests pauses (default 1024)
+    --timeout: default seconds a request may take (default: no limit)
+    --presolve: fill in naked and hidden singles for every micro-batch with NumPy before searching
+    """
+    options = {}
+    for name, convert, default in (('--socket', str, None), ('--unix', str, None), ('--engine', str, 'csp'),
+                                   ('--variable', str, None), ('--value', str, None), ('--propagate', str, 'fc'),
+                                   ('--workers', int, 1), ('--batch-size', int, 16), ('--batch-delay', float, 0.002),
+                                   ('--queue', int, 1024), ('--timeout', float, None)):
+        if name in sys.argv:
+            try:
+                options[name] = convert(sys.argv[sys.argv.index(name) + 1])
+            except (ValueError, IndexError):
+                print('Error: bad {} option.'.format(name[2:]), file=sys.stderr)
+                return
+        else:
+            options[name] = default
+
+    if options['--engine'] not in ENGINES:
+        print('Error: bad engine.', file=sys.stderr)
+        return
+    if options['--propagate'] not in PROPAGATION_LEVELS:
+        print('Error: bad propagation level.', file=sys.stderr)
+        return
+
+    host = port = None
+    if options['--socket'] is not None:
+        host, _, port = options['--socket'].rpartition(':')
+        try:
+            port = int(port)
+        except ValueError:
+            print('Error: bad socket option.', file=sys.stderr)
+            return
+
+    try:
+        service = SolveService(make_solver(options['--engine'], options['--variable'], options['--value'],
+                                           options['--propagate']),
+                               workers=options['--workers'], batch_size=options['--batch-size'],
+                               batch_delay=options['--batch-delay'], queue_size=options['--queue'],
+                               timeout=options['--timeout'], presolve='--presolve' in sys.argv)
+    except ValueError:
+        print('Error: bad service options.', file=sys.stderr)
+        return
+
+    try:
+        asyncio.run(_serve(service, host or None, port, options['--unix']))
+    except KeyboardInterrupt:
+        pass
+
+
+# run main function
+if __name__ == '__main__':
+    main()
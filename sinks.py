@@ -0,0 +1,210 @@
+"""
+Result sinks persisting the solutions of a batch as they are found
+
+solve_puzzles hands every SolveResult to its sink together with the puzzle it belongs to, so solutions are written
+out while the batch is still running instead of being solved again later. Sinks:
+
+    csv    - the solutions in one of the text formats read_puzzles detects (usually the format of the input), a
+             puzzle that couldn't be solved is written unchanged
+    jsonl  - one JSON object per puzzle with its index, status, solution, runtime and search statistics
+    corpus - a binary corpus storing every puzzle with its solution (all zeros if it couldn't be solved)
+
+Text sinks write through a large buffer. Only the jsonl sink records the index of every puzzle, so the other sinks
+should be fed in input order unless the order doesn't matter. Every sink can append to an existing file, and flush
+reports how many bytes of the file are complete, which is what a checkpoint records to resume a run.
+
+"""
+import json
+import os
+
+from corpus import CorpusWriter
+from helper_functions import PUZZLE_FORMATS, format_puzzle
+
+SINK_FORMATS = ('csv', 'jsonl', 'corpus')
+BUFFER_SIZE = 1 << 20       # bytes buffered by text sinks between writes to the file
+
+# file extensions implying a sink format
+_EXTENSIONS = {'.jsonl': 'jsonl', '.json': 'jsonl', '.sdk': 'corpus', '.corpus': 'corpus'}
+
+
+class CsvSink:
+    """Writes solutions in a text puzzle format."""
+
+    def __init__(self, path, style='symbols', append=False):
+        """
+        :param path: name of the file to be written
+        :param style: one of PUZZLE_FORMATS
+        :param append: whether to add to the end of an existing file instead of replacing it
+        """
+        if style not in PUZZLE_FORMATS:
+            raise ValueError('Unknown puzzle format {!r}, choose from {}'.format(style, PUZZLE_FORMATS))
+
+        self.style = style
+        self.count = 0
+        self._file = open(path, 'ab' if append else 'wb', buffering=BUFFER_SIZE)
+
+    def write(self, result, puzzle):
+        """
+        Writes the solution of a puzzle.
+
+        :param result: the SolveResult of the puzzle
+        :param puzzle: the puzzle as a 2D array board
+        """
+        board = result.board.board if result.board is not None else puzzle
+        self._file.write(('\n'.join(format_puzzle(board, self.style)) + '\n').encode())
+        self.count += 1
+
+    def flush(self):
+        """
+        Writes out the buffer.
+
+        :return: the size of the file in bytes
+        """
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        """
+        Flushes and closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JsonLinesSink:
+    """Writes every result as a line of JSON."""
+
+    def __init__(self, path, append=False):
+        """
+        :param path: name of the file to be written
+        :param append: whether to add to the end of an existing file instead of replacing it
+        """
+        self.count = 0
+        self._file = open(path, 'ab' if append else 'wb', buffering=BUFFER_SIZE)
+
+    def write(self, result, puzzle):
+        """
+        Writes the result of a puzzle.
+
+        :param result: the SolveResult of the puzzle
+        :param puzzle: the puzzle as a 2D array board (not written, the index identifies it)
+        """
+        record = {
+            'index': result.index,
+            'status': 'solved' if result.board is not None else 'failed',
+            'solution': result.board.board if result.board is not None else None,
+            'seconds': result.seconds,
+            'stats': result.stats.as_dict() if result.stats is not None else None,
+        }
+        if result.winner is not None:
+            record['winner'] = result.winner
+        if result.error is not None:
+            record['error'] = result.error
+
+        self._file.write((json.dumps(record) + '\n').encode())
+        self.count += 1
+
+    def flush(self):
+        """
+        Writes out the buffer.
+
+        :return: the size of the file in bytes
+        """
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        """
+        Flushes and closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CorpusSink:
+    """Writes every puzzle with its solution to a binary corpus."""
+
+    def __init__(self, path, append=False):
+        """
+        :param path: name of the corpus file to be written (created when the first result arrives, since the board
+                     size isn't known before)
+        :param append: whether to add to an existing corpus instead of replacing it
+        """
+        self.path = path
+        self.append = append and os.path.exists(path)
+        self._writer = None
+
+    @property
+    def count(self):
+        return self._writer.count if self._writer is not None else 0
+
+    def write(self, result, puzzle):
+        """
+        Writes a puzzle and its solution.
+
+        :param result: the SolveResult of the puzzle
+        :param puzzle: the puzzle as a 2D array board
+        """
+        if self._writer is None:
+            self._writer = CorpusWriter(self.path, len(puzzle), solutions=True, append=self.append)
+
+        if result.board is not None:
+            solution = result.board.board
+        else:
+            solution = [[0] * len(puzzle) for _ in puzzle]
+        self._writer.write(puzzle, solution)
+
+    def flush(self):
+        """
+        Records the current count in the corpus header and writes out the buffer.
+
+        :return: the size of the file in bytes
+        """
+        if self._writer is not None:
+            return self._writer.flush()
+        return os.path.getsize(self.path) if self.append else 0
+
+    def close(self):
+        """
+        Completes and closes the corpus.
+        """
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_sink(path, output_format=None, style=None, append=False):
+    """
+    Opens a result sink.
+
+    :param path: name of the file to be written
+    :param output_format: one of SINK_FORMATS (default: jsonl or corpus for files named *.jsonl or *.sdk, else csv)
+    :param style: the text format of a csv sink, one of PUZZLE_FORMATS (default symbols)
+    :param append: whether to add to the end of an existing file instead of replacing it
+    :return: the sink
+    """
+    if output_format is None:
+        output_format = _EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+    if output_format == 'csv':
+        return CsvSink(path, style or 'symbols', append)
+    elif output_format == 'jsonl':
+        return JsonLinesSink(path, append)
+    elif output_format == 'corpus':
+        return CorpusSink(path, append)
+    raise ValueError('Unknown sink format {!r}, choose from {}'.format(output_format, SINK_FORMATS))
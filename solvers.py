@@ -0,0 +1,36 @@
+"""
+Solver factory shared by the benchmark, the portfolio and the service
+
+Engines:
+    csp    - the heuristic backtracking CSP solver (csp.py), with the chosen heuristics and propagation level
+    native - the bitmask backtracking solver (native.py), with the chosen heuristics
+    dlx    - the Dancing Links exact cover solver (dlx.py), which has no heuristics to choose
+
+"""
+from csp import HeuristicRecursiveBacktrackingSolver
+from dlx import DancingLinksSolver
+from native import NativeSudokuSolver
+
+ENGINES = ('csp', 'native', 'dlx')
+
+
+def make_solver(engine, variable_id, value_id, propagate='fc', node_limit=None):
+    """
+    Instantiates a solver.
+
+    :param engine: one of ENGINES
+    :param variable_id: string identifier of the variable heuristic
+    :param value_id: string identifier of the value heuristic
+    :param propagate: propagation level of the csp engine
+    :param node_limit: optional node budget of every search of the csp and native engines (dlx has none)
+    :return: the solver
+    """
+    if engine == 'csp':
+        return HeuristicRecursiveBacktrackingSolver(variable_heuristic_id=variable_id, value_heuristic_id=value_id,
+                                                    propagate=propagate, node_limit=node_limit)
+    elif engine == 'native':
+        return NativeSudokuSolver(variable_heuristic_id=variable_id, value_heuristic_id=value_id,
+                                  node_limit=node_limit)
+    elif engine == 'dlx':
+        return DancingLinksSolver()
+    raise ValueError('Unknown engine {!r}, choose from {}'.format(engine, ENGINES))
@@ -0,0 +1,70 @@
+"""
+Search statistics of the recursive backtracking solver
+
+"""
+
+
+class SearchStats:
+    """
+    Counters and timings of one search (or, merged, of many).
+
+    nodes - calls of recursiveBacktracking, i.e. variables chosen plus solutions reached
+    backtracks - values retracted after their subtree was searched or they failed a constraint check
+    max_depth - the most variables assigned at once
+    constraint_calls - calls of constraint objects (each also forward checks, if enabled)
+    pushes, pops - domain states pushed / popped for forward checking
+    variable_seconds, value_seconds - time spent choosing variables / ordering values
+    constraint_seconds - time spent in constraint checks
+    propagation_seconds - time spent in constraint propagation (levels above fc)
+    refresh_seconds - time spent updating the variable queue and value counter after domains changed
+    restarts - runs cut off by the restart schedule
+    backjumps - backtracks that skipped at least one variable (conflict-directed backjumping)
+    nogood_prunes - values skipped because they completed a learned nogood
+    """
+
+    COUNTS = ('nodes', 'backtracks', 'max_depth', 'constraint_calls', 'pushes', 'pops', 'restarts', 'backjumps',
+              'nogood_prunes')
+    TIMES = ('variable_seconds', 'value_seconds', 'constraint_seconds', 'propagation_seconds', 'refresh_seconds')
+
+    __slots__ = COUNTS + TIMES
+
+    def __init__(self):
+        for name in self.COUNTS:
+            setattr(self, name, 0)
+        for name in self.TIMES:
+            setattr(self, name, 0.0)
+
+    def merge(self, other):
+        """
+        Adds the statistics of another search to these (max_depth is the maximum of both).
+
+        :param other: a SearchStats
+        :return: self
+        """
+        for name in self.COUNTS + self.TIMES:
+            if name == 'max_depth':
+                self.max_depth = max(self.max_depth, other.max_depth)
+            else:
+                setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def as_dict(self):
+        """
+        :return: a dict of {statistic: value, ...}
+        """
+        return {name: getattr(self, name) for name in self.COUNTS + self.TIMES}
+
+    def __getstate__(self):
+        return self.as_dict()
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __str__(self):
+        return ('{nodes} nodes, {backtracks} backtracks, max depth {max_depth}, {constraint_calls} constraint calls, '
+                '{pushes} pushes, {pops} pops, {restarts} restarts, {backjumps} backjumps, '
+                '{nogood_prunes} nogood prunes; '
+                'seconds in variable heuristic {variable_seconds:.6f}, value heuristic {value_seconds:.6f}, '
+                'constraints {constraint_seconds:.6f}, '
+                'propagation {propagation_seconds:.6f}, refresh {refresh_seconds:.6f}').format(**self.as_dict())
@@ -1,7 +1,19 @@
+import os
 import sys
 
-from helper_functions import read_standard_puzzles, read_jumbo_puzzles, solve_puzzles
+from helper_functions import PUZZLE_FORMATS, open_puzzles, puzzle_format, read_puzzles, solve_puzzles
 from csp import HeuristicRecursiveBacktrackingSolver
+from heuristics import RANDOMIZED_VALUE_HEURISTICS, RANDOMIZED_VARIABLE_HEURISTICS
+from inference import PROPAGATION_LEVELS
+from restarts import RESTART_SCHEDULES
+from native import NativeSudokuSolver
+from dlx import DancingLinksSolver
+from portfolio import PortfolioSolver, parse_portfolio
+from canonical import SolutionCache
+from sinks import open_sink
+from checkpoint import CHECKPOINT_EVERY, Checkpoint, truncate_output
+
+ORDERS = ('input', 'completion')     # orders in which results are written to the output file
 
 
 def main():
@@ -9,10 +21,49 @@ def main():
     This script performs an execution time test of a CSP algorithm on a set of sudokus with given heuristic(s).
 
     Usage: python tester.py subsquare_length [--variable var_heuristic_id] [--value val_heuristic_id]
+                            [--engine engine_id] [--workers worker_count] [--input input_file] [--presolve]
+                            [--propagate propagation_level] [--stats] [--restarts schedule]
+                            [--restart-base node_count] [--restart-factor factor] [--seed seed]
+                            [--portfolio configurations] [--backjump] [--nogoods capacity] [--cache]
+                            [--cache-file cache_file] [--output output_file] [--output-format output_format]
+                            [--order order] [--checkpoint checkpoint_file] [--checkpoint-every count]
+                            [--resume]
 
     subsquare_length: n = 3 or n = 4 for 9x9 or 16x16 sets, respectively
     var_heuristic_id: string identifier of the variable heuristic to be used
     val_heuristic_id: string identifier of the value heuristic to be used
+    engine_id: csp (default) for the python-constraint solver, native for the bitmask sudoku engine, dlx for the
+               Dancing Links exact cover solver (ignores the heuristics)
+    worker_count: number of processes solving puzzles in parallel (default 1)
+    input_file: puzzle file to solve instead of the default set for subsquare_length (any format read_puzzles
+                detects, including binary corpora)
+    --presolve: fill in naked and hidden singles for batches of puzzles with NumPy before searching
+    propagation_level: fc (default), ac3, singles or pairs, inference run by the csp engine after every assignment
+    --stats: record and print search statistics (nodes, backtracks, time per heuristic, ...) of the csp engine
+    schedule: luby or geometric, restart the csp search with a new random seed after a growing node budget (requires
+              a randomized heuristic, see heuristics.RANDOMIZED_VARIABLE_HEURISTICS / RANDOMIZED_VALUE_HEURISTICS)
+    node_count: node budget of the first run (default 100)
+    factor: growth factor of the geometric schedule (default 2)
+    seed: random seed of every csp search (restart k uses seed + k), for reproducible randomized heuristics
+    configurations: race these solvers on every puzzle in parallel processes instead of using a single engine, as
+                    comma separated var_heuristic_id/val_heuristic_id pairs for the csp engine, native:var/val pairs
+                    for the native engine or dlx, e.g. mrv/lcv,deg+mrv/least_used,dlx
+    --backjump: conflict-directed backjumping in the csp engine (requires the fc propagation level)
+    capacity: number of nogoods the backjumping csp engine keeps (default 0, learn none)
+    --cache: look puzzles up by canonical form in a solution cache before solving them (repeats of a puzzle under
+             relabeling, row/column/band/stack permutations or transposition are not searched again)
+    cache_file: sqlite3 database persisting the solution cache across runs (implies --cache)
+    output_file: write the solution of every puzzle to this file while solving
+    output_format: csv (the format of the input, default), jsonl (index, status, solution, runtime and search
+                   statistics per puzzle) or corpus (a binary corpus of the puzzles with their solutions); files
+                   named *.jsonl or *.sdk default to jsonl or corpus
+    order: input (default) or completion, the order in which results are written to the output file (completion
+           doesn't hold results back behind slower puzzles, only jsonl records the index of every puzzle)
+    checkpoint_file: record the finished puzzles and the size of the output file here every so often (default
+                     output_file.checkpoint when writing an output file)
+    count: number of results between checkpoints (default 256, a checkpoint is also saved every 30 seconds)
+    --resume: continue the run recorded in the checkpoint file, skipping the puzzles it has finished and appending
+              to the output file (starts from scratch if there is no checkpoint yet)
     """
     if len(sys.argv) >= 2:
         try:
@@ -31,22 +82,228 @@ def main():
         except (ValueError, IndexError):
             val_heuristic_id = None
 
-        # instantiate solver with specified heuristics
-        heuristic_solver = HeuristicRecursiveBacktrackingSolver(variable_heuristic_id=var_heuristic_id,
-                                                                value_heuristic_id=val_heuristic_id)
+        try:
+            engine_id = sys.argv[sys.argv.index('--engine') + 1]
+        except (ValueError, IndexError):
+            engine_id = 'csp'
+
+        try:
+            propagate = sys.argv[sys.argv.index('--propagate') + 1]
+        except (ValueError, IndexError):
+            propagate = 'fc'
+
+        if propagate not in PROPAGATION_LEVELS:
+            print('Error: bad propagation level.')
+            return
+
+        try:
+            restarts = sys.argv[sys.argv.index('--restarts') + 1]
+        except (ValueError, IndexError):
+            restarts = None
+
+        if restarts is not None and restarts not in RESTART_SCHEDULES:
+            print('Error: bad restart schedule.')
+            return
+
+        if restarts is not None and var_heuristic_id not in RANDOMIZED_VARIABLE_HEURISTICS and \
+                val_heuristic_id not in RANDOMIZED_VALUE_HEURISTICS:
+            print('Error: restarts require a randomized heuristic (variable random or mrv+random, or value random).')
+            return
+
+        restart_base = 100
+        if '--restart-base' in sys.argv:
+            try:
+                restart_base = int(sys.argv[sys.argv.index('--restart-base') + 1])
+            except (ValueError, IndexError):
+                restart_base = 0
+            if restart_base < 1:
+                print('Error: bad restart base.')
+                return
+
+        restart_factor = 2.0
+        if '--restart-factor' in sys.argv:
+            try:
+                restart_factor = float(sys.argv[sys.argv.index('--restart-factor') + 1])
+            except (ValueError, IndexError):
+                restart_factor = 0
+            if restart_factor < 1:
+                print('Error: bad restart factor.')
+                return
+
+        seed = None
+        if '--seed' in sys.argv:
+            try:
+                seed = int(sys.argv[sys.argv.index('--seed') + 1])
+            except (ValueError, IndexError):
+                print('Error: bad seed.')
+                return
+
+        nogoods = 0
+        if '--nogoods' in sys.argv:
+            try:
+                nogoods = int(sys.argv[sys.argv.index('--nogoods') + 1])
+            except (ValueError, IndexError):
+                nogoods = -1
+            if nogoods < 0 or nogoods and '--backjump' not in sys.argv:
+                print('Error: bad nogood capacity.')
+                return
 
-        # generate test puzzles
-        test_puzzles = []
+        if '--backjump' in sys.argv and propagate != 'fc':
+            print('Error: backjumping requires the fc propagation level.')
+            return
+
+        workers = 1
+        if '--workers' in sys.argv:
+            try:
+                workers = int(sys.argv[sys.argv.index('--workers') + 1])
+            except (ValueError, IndexError):
+                print('Error: bad worker count.')
+                return
+
+        # instantiate solver with specified heuristics
+        if '--portfolio' in sys.argv:
+            try:
+                heuristic_solver = PortfolioSolver(*parse_portfolio(sys.argv[sys.argv.index('--portfolio') + 1],
+                                                                    propagate))
+            except (ValueError, IndexError):
+                print('Error: bad portfolio.')
+                return
+        elif engine_id == 'native':
+            heuristic_solver = NativeSudokuSolver(variable_heuristic_id=var_heuristic_id,
+                                                  value_heuristic_id=val_heuristic_id)
+        elif engine_id == 'dlx':
+            heuristic_solver = DancingLinksSolver()
+        elif engine_id == 'csp':
+            heuristic_solver = HeuristicRecursiveBacktrackingSolver(variable_heuristic_id=var_heuristic_id,
+                                                                    value_heuristic_id=val_heuristic_id,
+                                                                    propagate=propagate,
+                                                                    stats='--stats' in sys.argv,
+                                                                    restarts=restarts,
+                                                                    restart_base=restart_base,
+                                                                    restart_factor=restart_factor,
+                                                                    seed=seed,
+                                                                    backjump='--backjump' in sys.argv,
+                                                                    nogoods=nogoods)
+        else:
+            print('Error: bad engine.')
+            return
 
-        if subsquare_length == 3:
-            test_puzzles = read_standard_puzzles('standard_size_sudokus.csv')
+        # generate test puzzles (read lazily while solving)
+        if '--input' in sys.argv:
+            try:
+                input_file = sys.argv[sys.argv.index('--input') + 1]
+            except IndexError:
+                print('Error: bad input file.')
+                return
+            test_puzzles = open_puzzles(input_file)
+        elif subsquare_length == 3:
+            input_file = 'standard_size_sudokus.csv'
+            test_puzzles = read_puzzles(input_file)
         elif subsquare_length == 4:
-            test_puzzles = read_jumbo_puzzles('jumbo_size_sudokus.csv')
+            input_file = 'jumbo_size_sudokus.csv'
+            test_puzzles = read_puzzles(input_file)
         else:
             print('Error: bad subsquare size.')
             return
 
-        solve_puzzles(test_puzzles, heuristic_solver)
+        try:
+            order = sys.argv[sys.argv.index('--order') + 1]
+        except (ValueError, IndexError):
+            order = 'input'
+
+        if order not in ORDERS:
+            print('Error: bad order.')
+            return
+
+        output_file = output_format = None
+        if '--output' in sys.argv:
+            try:
+                output_file = sys.argv[sys.argv.index('--output') + 1]
+            except IndexError:
+                print('Error: bad output file.')
+                return
+
+            try:
+                output_format = sys.argv[sys.argv.index('--output-format') + 1]
+            except (ValueError, IndexError):
+                output_format = None
+
+        checkpoint_file = output_file + '.checkpoint' if output_file is not None else None
+        if '--checkpoint' in sys.argv:
+            try:
+                checkpoint_file = sys.argv[sys.argv.index('--checkpoint') + 1]
+            except IndexError:
+                print('Error: bad checkpoint file.')
+                return
+
+        checkpoint_every = CHECKPOINT_EVERY
+        if '--checkpoint-every' in sys.argv:
+            try:
+                checkpoint_every = int(sys.argv[sys.argv.index('--checkpoint-every') + 1])
+            except (ValueError, IndexError):
+                checkpoint_every = 0
+            if checkpoint_every < 1:
+                print('Error: bad checkpoint interval.')
+                return
+
+        # a resumed run must solve the same input into the same output, which is cut back to its checkpointed size
+        checkpoint = None
+        resume = False
+        if checkpoint_file is not None:
+            meta = {'input': input_file, 'output': output_file, 'output_format': output_format}
+            if '--resume' in sys.argv and os.path.exists(checkpoint_file):
+                try:
+                    checkpoint = Checkpoint.load(checkpoint_file, every=checkpoint_every)
+                except (OSError, ValueError, KeyError):
+                    print('Error: bad checkpoint file.')
+                    return
+                if checkpoint.meta != meta:
+                    print('Error: the checkpoint belongs to a different run.')
+                    return
+                if output_file is not None:
+                    try:
+                        truncate_output(output_file, checkpoint.offset)
+                    except (OSError, ValueError):
+                        print('Error: the output file does not match the checkpoint.')
+                        return
+                resume = True
+            else:
+                checkpoint = Checkpoint(checkpoint_file, meta, every=checkpoint_every)
+        elif '--resume' in sys.argv:
+            print('Error: resuming requires an output or checkpoint file.')
+            return
+
+        sink = None
+        if output_file is not None:
+            # csv solutions are written in the format of the input (the jumbo format for a binary corpus)
+            style = puzzle_format(input_file)
+            try:
+                sink = open_sink(output_file, output_format, style if style in PUZZLE_FORMATS else 'flat',
+                                 append=resume)
+            except ValueError:
+                print('Error: bad output format.')
+                return
+
+        cache = None
+        if '--cache-file' in sys.argv:
+            try:
+                cache = SolutionCache(path=sys.argv[sys.argv.index('--cache-file') + 1])
+            except IndexError:
+                print('Error: bad cache file.')
+                return
+        elif '--cache' in sys.argv:
+            cache = SolutionCache()
+
+        try:
+            solve_puzzles(test_puzzles, heuristic_solver, workers=workers, presolve='--presolve' in sys.argv,
+                          cache=cache, sink=sink, ordered=order == 'input', checkpoint=checkpoint)
+        finally:
+            if isinstance(heuristic_solver, PortfolioSolver):
+                heuristic_solver.close()
+            if cache is not None:
+                cache.close()
+            if sink is not None:
+                sink.close()
 
     else:
         print('Error: bad input.')
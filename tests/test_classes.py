@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from classes import CompactBoard
+
+PUZZLE = [[0, 2, 0, 4],
+          [3, 0, 1, 0],
+          [0, 1, 0, 3],
+          [4, 0, 2, 0]]
+
+
+@pytest.mark.parametrize('preset', [
+    np.array(PUZZLE),
+    np.array(PUZZLE, dtype=np.uint8),
+    np.array(PUZZLE).ravel(),
+    np.array(PUZZLE, dtype=np.uint8).ravel(),
+    np.array(PUZZLE, dtype=np.int32).ravel().tolist(),
+], ids=['2d int64', '2d uint8', 'flat int64', 'flat uint8', 'flat list'])
+def test_compact_board_from_numpy(preset):
+    board = CompactBoard(preset)
+
+    assert board.board_size == 4
+    assert board.subsquare_size == 2
+    assert board.board == PUZZLE
+    assert board.check_valid()
+
+
+def test_compact_board_from_bytes():
+    flat = bytes(value for row in PUZZLE for value in row)
+
+    assert CompactBoard(flat).board == PUZZLE
+    assert CompactBoard(memoryview(flat)).board == PUZZLE
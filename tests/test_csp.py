@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from classes import CompactBoard
+from conftest import ROOT
+from csp import HeuristicRecursiveBacktrackingSolver
+from helper_functions import problem_template, puzzle_domains, read_puzzles
+from native import count_solutions
+
+MULTIPLE = [[1, 0, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 4],
+            [0, 0, 0, 0]]
+
+# no given repeats a value, but the third square of the first row has no value left
+UNSOLVABLE = [[1, 2, 0, 0],
+              [0, 0, 3, 0],
+              [0, 0, 4, 0],
+              [0, 0, 0, 0]]
+
+SOLVERS = {
+    'mrv': {'variable_heuristic_id': 'mrv'},
+    'mrv lcv': {'variable_heuristic_id': 'mrv', 'value_heuristic_id': 'lcv'},
+    'deg+mrv least_used': {'variable_heuristic_id': 'deg+mrv', 'value_heuristic_id': 'least_used'},
+    'mrv ac3': {'variable_heuristic_id': 'mrv', 'propagate': 'ac3'},
+    'mrv backjump': {'variable_heuristic_id': 'mrv', 'backjump': True},
+}
+
+
+def _unique():
+    return next(read_puzzles(os.path.join(ROOT, 'standard_size_sudokus.csv')))
+
+
+def _solution_iter(puzzle, max_solutions=None, **options):
+    board = CompactBoard(puzzle)
+    constraints, vconstraints = problem_template(board.board_size)
+    solver = HeuristicRecursiveBacktrackingSolver(**options)
+    return solver.getSolutionIter(puzzle_domains(board), constraints, vconstraints, max_solutions)
+
+
+def _solves(puzzle, solution):
+    board = CompactBoard(puzzle)
+    for index, value in solution.items():
+        if board.get_value(index) not in (0, value):
+            return False
+        board.set_value(index, value)
+    return board.check_valid()
+
+
+@pytest.mark.parametrize('options', SOLVERS.values(), ids=SOLVERS.keys())
+@pytest.mark.parametrize('puzzle', [_unique(), MULTIPLE, UNSOLVABLE], ids=['unique', 'multiple', 'unsolvable'])
+def test_solution_count(puzzle, options):
+    solutions = list(_solution_iter(puzzle, **options))
+
+    assert len(solutions) == count_solutions(CompactBoard(puzzle), limit=None)
+    assert len(set(tuple(sorted(solution.items())) for solution in solutions)) == len(solutions)
+    assert all(_solves(puzzle, solution) for solution in solutions)
+
+
+def test_solution_counts_of_test_boards():
+    assert count_solutions(CompactBoard(_unique()), limit=None) == 1
+    assert count_solutions(CompactBoard(MULTIPLE), limit=None) > 1
+    assert count_solutions(CompactBoard(UNSOLVABLE), limit=None) == 0
+
+
+@pytest.mark.parametrize('max_solutions', [0, 1, 5])
+def test_max_solutions(max_solutions):
+    solutions = list(_solution_iter(MULTIPLE, max_solutions, variable_heuristic_id='mrv'))
+
+    assert len(solutions) == max_solutions
+    assert all(_solves(MULTIPLE, solution) for solution in solutions)
+
+
+def test_max_solutions_above_count():
+    count = count_solutions(CompactBoard(MULTIPLE), limit=None)
+
+    assert len(list(_solution_iter(MULTIPLE, count + 10))) == count
+
+
+def test_solutions_are_lazy():
+    # an empty 9x9 board has far too many solutions to enumerate, so only a lazy iterator gets past next()
+    empty = [[0] * 9 for _ in range(9)]
+    solutions = _solution_iter(empty, variable_heuristic_id='mrv')
+
+    first, second = next(solutions), next(solutions)
+
+    assert _solves(empty, first) and _solves(empty, second)
+    assert first != second
+    solutions.close()
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+
+from conftest import ROOT
+from dlx import DancingLinksSolver
+from helper_functions import read_puzzles, solve_chunk
+from service import SolveService, serve_lines
+
+
+def _first_puzzles(file_name, count):
+    puzzles = read_puzzles(os.path.join(ROOT, file_name))
+    return [next(puzzles) for _ in range(count)]
+
+
+def _solves(puzzle, solution):
+    return all(value in (0, solution[row][col]) for row, values in enumerate(puzzle) for col, value in enumerate(values))
+
+
+def test_presolve_mixed_size_chunk():
+    puzzles = _first_puzzles('standard_size_sudokus.csv', 2) + _first_puzzles('jumbo_size_sudokus.csv', 2)
+    chunk = [puzzles[0], puzzles[2], puzzles[1], puzzles[3]]
+
+    results = solve_chunk(enumerate(chunk), DancingLinksSolver(), presolve=True)
+
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    for result, puzzle in zip(results, chunk):
+        assert result.board is not None and result.board.check_valid()
+        assert _solves(puzzle, result.board.board)
+
+
+def test_service_mixed_size_batch():
+    puzzles = _first_puzzles('standard_size_sudokus.csv', 3) + _first_puzzles('jumbo_size_sudokus.csv', 3)
+
+    async def solve_all():
+        # a long batch delay puts all puzzles in one micro-batch
+        async with SolveService(DancingLinksSolver(), batch_size=len(puzzles), batch_delay=0.2,
+                                presolve=True) as service:
+            return await asyncio.gather(*(service.solve(puzzle) for puzzle in puzzles))
+
+    for response, puzzle in zip(asyncio.run(solve_all()), puzzles):
+        assert response['status'] == 'solved'
+        assert _solves(puzzle, response['solution'])
+
+
+def test_bad_request_echoes_id():
+    lines = [json.dumps({'id': 7, 'puzzle': [[1, 2], [3]]}), json.dumps({'id': 'x'}), 'not json', '']
+    written = []
+
+    async def readline():
+        return lines.pop(0)
+
+    async def write(line):
+        written.append(json.loads(line))
+
+    async def serve():
+        async with SolveService(DancingLinksSolver()) as service:
+            await serve_lines(service, readline, write)
+
+    asyncio.run(serve())
+    assert [response['id'] for response in written] == [7, 'x', None]
+    assert all(response['status'] == 'error' for response in written)
+
+
+def test_bad_puzzle_only_fails_itself():
+    puzzles = _first_puzzles('standard_size_sudokus.csv', 2)
+    bad = [row[:] for row in puzzles[0]]
+    bad[0][0] = 300     # not a byte, the board can't even be built in the worker
+
+    async def solve_all():
+        async with SolveService(DancingLinksSolver(), batch_size=3, batch_delay=0.2) as service:
+            return await asyncio.gather(*(service.solve(puzzle) for puzzle in (puzzles[0], bad, puzzles[1])))
+
+    good, failed, other = asyncio.run(solve_all())
+    assert good['status'] == 'solved' and _solves(puzzles[0], good['solution'])
+    assert other['status'] == 'solved' and _solves(puzzles[1], other['solution'])
+    assert failed['status'] == 'error' and 'ValueError' in failed['error']
+
+
+def test_out_of_range_requests_are_rejected():
+    puzzles = _first_puzzles('standard_size_sudokus.csv', 2)
+    flat = [','.join(str(value) for row in puzzle for value in row) for puzzle in puzzles]
+    lines = [json.dumps({'id': 0, 'puzzle': flat[0]}),
+             json.dumps({'id': 1, 'puzzle': flat[0].replace('0', '300', 1)}),
+             json.dumps({'id': 2, 'puzzle': flat[1].replace('0', '10', 1)}),
+             json.dumps({'id': 3, 'puzzle': [[10] * 9] * 9}),
+             json.dumps({'id': 4, 'puzzle': flat[1]}),
+             '']
+    written = []
+
+    async def readline():
+        return lines.pop(0)
+
+    async def write(line):
+        written.append(json.loads(line))
+
+    async def serve():
+        async with SolveService(DancingLinksSolver(), batch_size=5, batch_delay=0.2) as service:
+            await serve_lines(service, readline, write)
+
+    asyncio.run(serve())
+    statuses = {response['id']: response['status'] for response in written}
+    assert statuses == {0: 'solved', 1: 'error', 2: 'error', 3: 'error', 4: 'solved'}
+    assert all('bad request' in response['error'] for response in written if response['status'] == 'error')
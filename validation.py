@@ -0,0 +1,74 @@
+"""
+Vectorized validation of batches of sudoku boards
+
+Boards are checked all at once as an (N, n^2, n^2) NumPy array: every square is expanded into a one-hot vector of
+its value, and summing those along rows, columns and subsquares counts how often each value occurs in each unit.
+
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# per-board pass/fail masks returned by validate_boards
+BoardChecks = namedtuple('BoardChecks', ['consistent', 'solved', 'matches_puzzle'])
+
+BLOCK_SIZE = 4096       # boards expanded to one-hot at once, bounds the temporary memory
+
+
+def validate_boards(boards, puzzles=None):
+    """
+    Checks a batch of boards.
+
+    :param boards: an (N, n^2, n^2) array (or nested lists) of boards, 0 for empty squares
+    :param puzzles: optional (N, n^2, n^2) array of the puzzles the boards were solved from
+    :return: a BoardChecks of boolean arrays of length N:
+             consistent - every value is in 1...n^2 (or 0) and no value repeats in a row, column or subsquare
+             solved - consistent and every square is filled, i.e. the board is a full solution
+             matches_puzzle - every given square of the puzzle holds the same value on the board (all True if no
+                              puzzles are given)
+    """
+    boards = np.asarray(boards)
+    if boards.ndim != 3 or boards.shape[1] != boards.shape[2]:
+        raise ValueError('Expected an (N, size, size) array of boards, got shape {}'.format(boards.shape))
+
+    count, size = boards.shape[0], boards.shape[1]
+    subsquare_size = int(round(np.sqrt(size)))
+    if subsquare_size ** 2 != size:
+        raise ValueError('Board size {} is not a square'.format(size))
+
+    consistent = np.empty(count, dtype=bool)
+    for start in range(0, count, BLOCK_SIZE):
+        consistent[start:start + BLOCK_SIZE] = _consistent(boards[start:start + BLOCK_SIZE], subsquare_size)
+
+    solved = consistent & (boards != 0).all(axis=(1, 2))
+
+    if puzzles is None:
+        matches_puzzle = np.ones(count, dtype=bool)
+    else:
+        puzzles = np.asarray(puzzles)
+        if puzzles.shape != boards.shape:
+            raise ValueError('Expected puzzles of shape {}, got {}'.format(boards.shape, puzzles.shape))
+        matches_puzzle = ((puzzles == 0) | (boards == puzzles)).all(axis=(1, 2))
+
+    return BoardChecks(consistent, solved, matches_puzzle)
+
+
+def _consistent(boards, subsquare_size):
+    """
+    Consistency mask of a block of boards.
+    """
+    count, size = boards.shape[0], boards.shape[1]
+    in_range = ((boards >= 0) & (boards <= size)).all(axis=(1, 2))
+
+    # one_hot[b, row, col, v] is set when square (row, col) of board b holds value v + 1
+    one_hot = boards[..., None] == np.arange(1, size + 1)
+
+    row_counts = one_hot.sum(axis=2, dtype=np.uint16)
+    col_counts = one_hot.sum(axis=1, dtype=np.uint16)
+    subsquare_counts = one_hot.reshape(count, subsquare_size, subsquare_size, subsquare_size, subsquare_size,
+                                       size).sum(axis=(2, 4), dtype=np.uint16)
+
+    return (in_range &
+            (row_counts <= 1).all(axis=(1, 2)) &
+            (col_counts <= 1).all(axis=(1, 2)) &
+            (subsquare_counts <= 1).all(axis=(1, 2, 3)))